@@ -20,6 +20,9 @@ finish_multiprocessing = []
 start_thread = []
 finish_thread = []
 
+# The worker processes are started once, and reused for all the examples.
+pool = steinitz.EdgePool()
+
 for i in range(num_of_examples):
     logging.info('Example number {0}'.format(i))
     num1 = random.randint(0, 3)
@@ -34,21 +37,23 @@ for i in range(num_of_examples):
     capacity = int(sum(A[0])/2)
     b = np.array([capacity,capacity,1,1])
 
-    source = '[0 0 0 0]'
-    target = '[{0} {0} 1 1]'.format(capacity)
+    source = np.zeros(4, dtype=int)
+    target = b
 
     start.append(time.perf_counter())
     steinitz.check_feasibility(steinitz.setup(A, b, c), source, target)
     finish.append(time.perf_counter())
 
     start_multiprocessing.append(time.perf_counter())
-    steinitz.check_feasibility(steinitz.setup(A, b, c, False, True), source, target)
+    steinitz.check_feasibility(steinitz.setup(A, b, c, pool=pool), source, target)
     finish_multiprocessing.append(time.perf_counter())
 
     start_thread.append(time.perf_counter())
     steinitz.check_feasibility(steinitz.setup(A, b, c, True, False), source, target)
     finish_thread.append(time.perf_counter())
 
+pool.close()
+
 total_time = list(map(sub, finish, start))
 total_time_multiprocessing = list(map(sub, finish_multiprocessing, start_multiprocessing))
 total_time_thread = list(map(sub, finish_thread, start_thread))
@@ -20,8 +20,8 @@ class partitioning:
     from prtpy.partitioning.ilp import optimal as ilp
     from prtpy.partitioning.ilp import optimal as integer_programming
 
-    from prtpy.partitioning.steinitz import steinitz_ip as ip
-    from prtpy.partitioning.steinitz import steinitz_ip as integer_programming_steinitz
+    from prtpy.partitioning.steinitz import optimal as ip
+    from prtpy.partitioning.steinitz import optimal as integer_programming_steinitz
 
     from prtpy.partitioning.greedy import greedy
     from prtpy.partitioning.greedy import greedy as lpt
@@ -34,6 +34,11 @@ class partitioning:
 class packing:
     from prtpy.packing.first_fit import online as first_fit, decreasing as first_fit_decreasing
     from prtpy.packing.first_fit import online as ff, decreasing as ffd
+    from prtpy.packing.arc_flow import optimal as arc_flow
+    from prtpy.packing.next_fit import online as next_fit, decreasing as next_fit_decreasing
+    from prtpy.packing.worst_fit import online as worst_fit, decreasing as worst_fit_decreasing
+    from prtpy.packing.worst_fit import almost_worst_fit
+    from prtpy.packing.harmonic import online as harmonic
 
 class covering:
     from prtpy.packing.greedy_covering import decreasing as decreasing
@@ -46,8 +51,8 @@ class exact:  # Algorithms that return the exact optimal partition
     from prtpy.partitioning.dp import optimal as dynamic_programming
     from prtpy.partitioning.ilp import optimal as ilp
     from prtpy.partitioning.ilp import optimal as integer_programming
-    from prtpy.partitioning.steinitz import steinitz_ip as ip
-    from prtpy.partitioning.steinitz import steinitz_ip as integer_programming_steinitz
+    from prtpy.partitioning.steinitz import optimal as ip
+    from prtpy.partitioning.steinitz import optimal as integer_programming_steinitz
 
 
 # class approx:  # Algorithms that return an approximately-optimal partition
@@ -7,7 +7,7 @@ Since:  2022-02
 
 from abc import ABC, abstractmethod
 import numpy as np
-from typing import Any, Callable
+from typing import Any, Callable, List
 
 
 class Bins(ABC):
@@ -35,6 +35,15 @@ class Bins(ABC):
         """
         pass
 
+    def add_items_to_bin(self, items: List[Any], bin_index: int, total: float = None):
+        """
+        Add all the given items to the bin with the given index, in place.
+        `total` is the sum of their values; if it is not given, it is computed with valueof.
+        """
+        for item in items:
+            self.add_item_to_bin(item, bin_index)
+        return self
+
     @abstractmethod
     def add_empty_bins(self, numbins: int=1):
         """
@@ -141,6 +150,26 @@ class BinsKeepingSums(Bins):
             new_sums[bin_index] += value
             return BinsKeepingSums(self.num, new_sums).set_valueof(self.valueof)
 
+    def remove_item_from_bin(self, item: Any, bin_index: int)->Bins:
+        """
+        Remove the given item from the bin with the given index, in place.
+
+        >>> BinsKeepingSums(2).add_item_to_bin(5, 1).remove_item_from_bin(5, 1)
+        Bin #0: sum=0.0
+        Bin #1: sum=0.0
+        """
+        self.sums[bin_index] -= self.valueof(item)
+        return self
+
+    def add_items_to_bin(self, items: List[Any], bin_index: int, total: float = None)->Bins:
+        """
+        >>> BinsKeepingSums(2).add_items_to_bin([1, 2, 3], 1)
+        Bin #0: sum=0.0
+        Bin #1: sum=6.0
+        """
+        self.sums[bin_index] += total if total is not None else sum(map(self.valueof, items))
+        return self
+
     def bin_to_str(self, bin_index: int) -> str:
         return f"sum={self.sums[bin_index]}"
 
@@ -227,6 +256,24 @@ class BinsKeepingContents(BinsKeepingSums):
             new_bins[bin_index] = new_bins[bin_index] + [item]
             return BinsKeepingContents(self.num, new_sums, new_bins).set_valueof(self.valueof)
 
+    def remove_item_from_bin(self, item: Any, bin_index: int)->Bins:
+        """
+        >>> BinsKeepingContents(1).add_items_to_bin([3, 4, 3], 0).remove_item_from_bin(3, 0)
+        Bin #0: [4, 3], sum=7.0
+        """
+        self.bins[bin_index].remove(item)
+        return super().remove_item_from_bin(item, bin_index)
+
+    def add_items_to_bin(self, items: List[Any], bin_index: int, total: float = None)->Bins:
+        """
+        >>> BinsKeepingContents(2).add_items_to_bin(["a", "b"], 0, total=7)
+        Bin #0: ['a', 'b'], sum=7.0
+        Bin #1: [], sum=0.0
+        """
+        super().add_items_to_bin(items, bin_index, total)
+        self.bins[bin_index].extend(items)
+        return self
+
     def bin_to_str(self, bin_index: int) -> str:
         return f"{self.bins[bin_index]}, sum={self.sums[bin_index]}"
 
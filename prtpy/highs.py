@@ -0,0 +1,221 @@
+"""
+A minimal modelling layer for mixed-integer linear programs, solved by HiGHS through scipy.optimize.milp.
+
+Large, structured blocks of constraints are added directly as sparse matrices, with no per-term Python objects.
+Small constraints (e.g. on the bin sums) can be written with LinearExpression objects,
+using the same operators as in python-mip, so that objectives and additional constraints work with both.
+"""
+
+import numpy as np
+from math import inf
+from numbers import Number
+from typing import Dict
+from scipy import sparse
+from scipy.optimize import milp, LinearConstraint, Bounds
+
+
+class LinearExpression:
+    """
+    A linear expression over the variables of a Model: a map from variable-index to coefficient, plus a constant.
+
+    >>> x, y = LinearExpression({0: 1}), LinearExpression({1: 1})
+    >>> 2*x - y/2 + 3
+    2*v0 - 0.5*v1 + 3
+    >>> sum([x, y, x])
+    2*v0 + 1*v1
+    >>> x + 1 >= y
+    1*v0 - 1*v1 >= -1
+    """
+
+    __slots__ = ("coefs", "constant")
+    __hash__ = None
+
+    def __init__(self, coefs: Dict[int, float] = None, constant: float = 0):
+        self.coefs = coefs if coefs is not None else {}
+        self.constant = constant
+
+    @staticmethod
+    def _of(other) -> "LinearExpression":
+        return other if isinstance(other, LinearExpression) else LinearExpression(constant=other)
+
+    def __add__(self, other):
+        other = LinearExpression._of(other)
+        coefs = dict(self.coefs)
+        for var, coef in other.coefs.items():
+            coefs[var] = coefs.get(var, 0) + coef
+        return LinearExpression(coefs, self.constant + other.constant)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return LinearExpression({var: -coef for var, coef in self.coefs.items()}, -self.constant)
+
+    def __sub__(self, other):
+        return self + (-LinearExpression._of(other))
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __mul__(self, scalar: Number):
+        return LinearExpression({var: coef * scalar for var, coef in self.coefs.items()}, self.constant * scalar)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar: Number):
+        return self * (1 / scalar)
+
+    def __le__(self, other):
+        difference = self - other
+        return Constraint(difference.coefs, -inf, -difference.constant)
+
+    def __ge__(self, other):
+        difference = self - other
+        return Constraint(difference.coefs, -difference.constant, inf)
+
+    def __eq__(self, other):
+        difference = self - other
+        return Constraint(difference.coefs, -difference.constant, -difference.constant)
+
+    def __repr__(self) -> str:
+        terms = [f"{coef:g}*v{var}" for var, coef in sorted(self.coefs.items())]
+        if self.constant != 0 or not terms:
+            terms.append(f"{self.constant:g}")
+        return " + ".join(terms).replace("+ -", "- ")
+
+
+class Constraint:
+    """
+    A single linear constraint: lower <= sum(coefs[var] * var) <= upper.
+    """
+
+    __slots__ = ("coefs", "lower", "upper")
+
+    def __init__(self, coefs: Dict[int, float], lower: float, upper: float):
+        self.coefs = coefs
+        self.lower = lower
+        self.upper = upper
+
+    def __repr__(self) -> str:
+        expression = repr(LinearExpression(self.coefs))
+        if self.lower == self.upper:
+            return f"{expression} == {self.lower:g}"
+        elif self.lower == -inf:
+            return f"{expression} <= {self.upper:g}"
+        elif self.upper == inf:
+            return f"{expression} >= {self.lower:g}"
+        return f"{self.lower:g} <= {expression} <= {self.upper:g}"
+
+
+class Model:
+    """
+    A mixed-integer linear program, solved by HiGHS.
+
+    >>> model = Model()
+    >>> x = model.add_var(ub=10, integer=True)
+    >>> y = model.add_var(ub=10, integer=True)
+    >>> model += 2*x + 3*y <= 12
+    >>> model += x - y >= 1
+    >>> result = model.optimize(-x - y)
+    >>> result.status, result.x.round().astype(int).tolist()
+    (0, [6, 0])
+    """
+
+    def __init__(self):
+        self.lb = np.zeros(0)
+        self.ub = np.zeros(0)
+        self.integrality = np.zeros(0, dtype=np.int8)
+        self._blocks = []  # sparse constraint blocks: (matrix, lower, upper).
+        self._constraints = []  # single constraints built from LinearExpression objects.
+
+    @property
+    def num_vars(self) -> int:
+        return len(self.lb)
+
+    def add_vars(self, count: int, lb: float = 0, ub: float = inf, integer: bool = False) -> np.ndarray:
+        """
+        Add `count` new variables, and return the array of their indices.
+        The bounds lb and ub are either numbers, or arrays with a bound for each variable.
+        """
+        first = self.num_vars
+        self.lb = np.concatenate((self.lb, np.full(count, lb, dtype=float)))
+        self.ub = np.concatenate((self.ub, np.full(count, ub, dtype=float)))
+        self.integrality = np.concatenate((self.integrality, np.full(count, int(integer), dtype=np.int8)))
+        return np.arange(first, first + count)
+
+    def add_var(self, lb: float = 0, ub: float = inf, integer: bool = False) -> LinearExpression:
+        """
+        Add a single new variable, and return it as a LinearExpression.
+        """
+        (index,) = self.add_vars(1, lb, ub, integer)
+        return LinearExpression({int(index): 1})
+
+    def add_constraint(self, constraint: Constraint):
+        self._constraints.append(constraint)
+        return self
+
+    def __iadd__(self, constraint: Constraint):
+        return self.add_constraint(constraint)
+
+    def add_sparse_constraints(self, matrix: sparse.spmatrix, lower, upper):
+        """
+        Add the constraints lower <= matrix @ variables <= upper.
+        The matrix may have fewer columns than the number of variables; the missing columns are zero.
+        """
+        self._blocks.append((sparse.coo_matrix(matrix), np.broadcast_to(lower, matrix.shape[0]), np.broadcast_to(upper, matrix.shape[0])))
+        return self
+
+    def _constraint_matrix(self):
+        rows, cols, data, lowers, uppers = [], [], [], [], []
+        num_rows = 0
+        for matrix, lower, upper in self._blocks:
+            rows.append(matrix.row + num_rows)
+            cols.append(matrix.col)
+            data.append(matrix.data)
+            lowers.append(lower)
+            uppers.append(upper)
+            num_rows += matrix.shape[0]
+        for constraint in self._constraints:
+            rows.append(np.full(len(constraint.coefs), num_rows))
+            cols.append(np.fromiter(constraint.coefs.keys(), dtype=int, count=len(constraint.coefs)))
+            data.append(np.fromiter(constraint.coefs.values(), dtype=float, count=len(constraint.coefs)))
+            lowers.append([constraint.lower])
+            uppers.append([constraint.upper])
+            num_rows += 1
+        if num_rows == 0:
+            return None
+        matrix = sparse.csr_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape=(num_rows, self.num_vars)
+        )
+        return LinearConstraint(matrix, np.concatenate(lowers), np.concatenate(uppers))
+
+    def optimize(self, objective: LinearExpression, max_seconds: float = inf, verbose: int = 0):
+        """
+        Minimize the given objective. Return the scipy.optimize.milp result;
+        its `fun` includes the constant of the objective.
+        """
+        objective = LinearExpression._of(objective)
+        c = np.zeros(self.num_vars)
+        for var, coef in objective.coefs.items():
+            c[var] += coef
+        # The HiGHS presolve of scipy may return wrong "optimal" solutions of the partition models, so it is turned off.
+        options = {"disp": bool(verbose), "presolve": False}
+        if max_seconds < inf:
+            options["time_limit"] = max_seconds
+        constraints = self._constraint_matrix()
+        result = milp(
+            c,
+            integrality=self.integrality,
+            bounds=Bounds(self.lb, self.ub),
+            constraints=constraints if constraints is not None else (),
+            options=options,
+        )
+        if result.fun is not None:
+            result.fun += objective.constant
+        return result
+
+
+if __name__ == "__main__":
+    import doctest
+
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
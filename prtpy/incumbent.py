@@ -0,0 +1,40 @@
+"""
+The best solution found so far by an exact or anytime algorithm, with a proven lower bound on the optimal value.
+It is reported to the callback of bin completion, and the ILP partitioning uses it to compute the gap of its solution.
+"""
+
+from dataclasses import dataclass
+from prtpy.bins import Bins
+
+
+@dataclass
+class Incumbent:
+    """
+    A feasible solution (a partition or a packing, in bins), with the value that the algorithm minimizes for it
+    (e.g. the objective value of a partition, or the number of bins of a packing), and a proven lower bound on the optimal value.
+
+    >>> Incumbent(bins=None, objective_value=110, lower_bound=100, is_optimal=False).gap
+    0.09090909090909091
+    >>> Incumbent(bins=None, objective_value=7, lower_bound=7, is_optimal=True).gap
+    0
+    """
+    bins: Bins
+    objective_value: float  # the value to minimize for this solution.
+    lower_bound: float      # a proven lower bound on the optimal value.
+    is_optimal: bool        # whether the algorithm proved that this solution is optimal.
+
+    @property
+    def gap(self) -> float:
+        """
+        The relative gap between the objective value and the lower bound. It is 0 for an optimal solution.
+        """
+        if self.is_optimal or self.objective_value == self.lower_bound:
+            return 0
+        return abs(self.objective_value - self.lower_bound) / max(abs(self.objective_value), 1e-10)
+
+
+if __name__ == "__main__":
+    import doctest
+
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
@@ -1,11 +1,18 @@
 '''
-This file contains some methods that build a partitionning problem to a standard IP form.
+This file contains some methods that build a partitionning problem to a standard IP form: A.x = b, x >= 0 integer, maximize c.x.
+
+The variables are x[j*n+i], which is 1 iff item i is in bin j (for k bins and n items), and one slack variable k*n+j for each bin j.
+The first k rows say that the sum of each bin j, plus its slack, equals the capacity;
+the next n rows say that each item is in exactly one bin.
+So the IP is feasible iff the items can be partitioned into k bins with sums at most the capacity.
+The matrices are sparse, and their integer types are wide enough for the item values.
 '''
 
 import logging
-from prtpy import outputtypes as Bins
-from typing import List, Any
+from prtpy.bins import Bins
+from typing import List
 import numpy as np
+from scipy import sparse
 
 
 # If you want the debug loggings to be printed in the terminal, uncomment this line.
@@ -15,50 +22,92 @@ import numpy as np
 # logging.basicConfig(level=logging.INFO)
 
 
-def build_A_for_partition(bins: Bins, items: List[Any])->np.ndarray:
+def build_A_for_partition(bins: Bins, items: List[int])->sparse.csr_matrix:
     '''
-    Function that builds the matrix A.
+    Function that builds the matrix A, with k+n rows and k*n+k columns.
+
+    >>> from prtpy.bins import BinsKeepingSums
+    >>> build_A_for_partition(BinsKeepingSums(2), [100, 200]).toarray()
+    array([[100, 200,   0,   0,   1,   0],
+           [  0,   0, 100, 200,   0,   1],
+           [  1,   0,   1,   0,   0,   0],
+           [  0,   1,   0,   1,   0,   0]], dtype=int16)
     '''
-    len_items = len(items)
+    values = _integer_values(items)
+    len_items = len(values)
     bins_num = bins.num
 
-    n = bins_num * len_items
+    n = bins_num * len_items + bins_num
     m = bins_num + len_items
     logging.info('n:{0}'.format(n))
     logging.info('m:{0}'.format(m))
 
-    A = []
-
-    for i in range(0, m, len_items):
-        line = [0] * i + items + [0]*(len_items-i)  
-        logging.debug('line:{0}'.format(line))
-        A.append(line)
-
-    for i in range(0, len_items):
-        line = [0]*n
-        for j in range(i, n, len_items):
-            line[j] = 1
-        logging.debug('line:{0}'.format(line))
-        A.append(line)
-    logging.info('A:{0}'.format(A))
-    return np.array(A, dtype=np.int8)
+    assignment = np.arange(bins_num * len_items)
+    rows = np.concatenate((
+        np.repeat(np.arange(bins_num), len_items),     # the sum of bin j ...
+        np.arange(bins_num),                           # ... plus its slack,
+        bins_num + np.tile(np.arange(len_items), bins_num),  # and the bins of item i.
+    ))
+    cols = np.concatenate((assignment, bins_num * len_items + np.arange(bins_num), assignment))
+    data = np.concatenate((np.tile(values, bins_num), np.ones(bins_num, dtype=np.int64), np.ones(bins_num * len_items, dtype=np.int64)))
+    A = sparse.csr_matrix((data.astype(int_dtype(values.max(initial=1))), (rows, cols)), shape=(m, n))
+    logging.info('A: {0} matrix with {1} non-zeros'.format(A.shape, A.nnz))
+    return A
 
 
-def build_b_for_partition(bins: Bins, items: List[Any])->np.ndarray:
+def build_b_for_partition(bins: Bins, items: List[int], capacity: int = None)->np.ndarray:
     '''
-    Function that builds the vector b.
+    Function that builds the vector b. The default capacity is the sum of the items divided by the number of bins, rounded up.
+
+    >>> from prtpy.bins import BinsKeepingSums
+    >>> build_b_for_partition(BinsKeepingSums(2), [100, 200])
+    array([150, 150,   1,   1], dtype=int16)
     '''
-    len_items = len(items)
+    values = _integer_values(items)
+    len_items = len(values)
     bins_num = bins.num
-    b = np.array([sum(items) / 2] * bins_num + [1] * len_items, dtype=np.int8)
+    if capacity is None:
+        capacity = -(-int(values.sum()) // bins_num)
+    b = np.array([capacity] * bins_num + [1] * len_items, dtype=int_dtype(capacity))
     logging.info('b:{0}'.format(b))
     return b
 
 
-def build_c_for_partition(n)->np.ndarray:
+def build_c_for_partition(n: int)->sparse.csr_matrix:
+    '''
+    Function that builds the vector c, as a sparse 1 x n matrix.
+    Every partition with sums at most the capacity is optimal, so c has no non-zeros.
+
+    >>> c = build_c_for_partition(6)
+    >>> c.shape, c.nnz
+    ((1, 6), 0)
+    >>> c.toarray()
+    array([[0, 0, 0, 0, 0, 0]], dtype=int8)
+    '''
+    c = sparse.csr_matrix((1, n), dtype=np.int8)
+    logging.info('c: {0} matrix with {1} non-zeros'.format(c.shape, c.nnz))
+    return c
+
+
+def _integer_values(items: List[int])->np.ndarray:
+    values = np.asarray(items)
+    if len(values) > 0 and (values.min() < 0 or not np.array_equal(values, np.round(values))):
+        raise ValueError(f"The item values {items} should be non-negative integers.")
+    return values.astype(np.int64)
+
+
+def int_dtype(bound: int):
     '''
-    Function that builds the vector c.
+    The smallest signed integer type (at least int8) that can hold the values -bound,...,bound.
+
+    >>> int_dtype(100), int_dtype(200)
+    (dtype('int8'), dtype('int16'))
     '''
-    c = np.array([0] *  n, dtype=np.int8)
-    logging.info('c:{0}'.format(c))
-    return c
\ No newline at end of file
+    return np.promote_types(np.int8, np.min_scalar_type(-abs(int(bound))))
+
+
+if __name__ == "__main__":
+    import doctest
+
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
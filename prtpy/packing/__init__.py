@@ -9,6 +9,7 @@ such as: a list of values, and a dict that maps an item to its value.
 """
 
 from prtpy import outputtypes as out
+from prtpy.packing import bounds
 from typing import Callable, List, Any
 
 
@@ -19,6 +20,7 @@ def pack(
     items: Any,
     valueof: Callable[[Any], float] = None,
     outputtype: out.OutputType = out.Partition,
+    with_lower_bound: bool = False,
     **kwargs
 ) -> List[List[int]]:
     """
@@ -39,7 +41,11 @@ def pack(
 
     :param outputtype: defines the output format. See `outputtypes.py'.
 
+    :param with_lower_bound: if True, also return the L3 lower bound on the number of bins (see `bounds.py'),
+        and whether the packing attains it, which certifies that it is optimal.
+
     :return: a partition, or a list of sums - depending on outputtype.
+        If with_lower_bound is True: a tuple (output, lower bound, is optimal).
 
     >>> import prtpy
     >>> from prtpy.packing.first_fit import decreasing as ffd
@@ -54,6 +60,10 @@ def pack(
     3
     >>> pack(algorithm=ffd, binsize=61, items=[44, 24, 24, 22, 21, 17, 8, 8, 6, 6], outputtype=out.BinCount)
     4
+    >>> pack(algorithm=ffd, binsize=60, items=[44, 24, 24, 22, 21, 17, 8, 8, 6, 6], with_lower_bound=True)
+    ([[44, 8, 8], [24, 24, 6, 6], [22, 21, 17]], 3, True)
+    >>> pack(algorithm=ffd, binsize=10, items=[6, 4, 4, 4, 3, 3, 3, 3], outputtype=out.BinCount, with_lower_bound=True)
+    (4, 3, False)
     """
     if isinstance(items, dict):  # items is a dict mapping an item to its value.
         item_names = items.keys()
@@ -66,7 +76,11 @@ def pack(
     bins = outputtype.create_empty_bins(0)
     bins.set_valueof(valueof)
     bins = algorithm(bins, binsize, item_names, valueof, **kwargs)
-    return outputtype.extract_output_from_bins(bins)
+    output = outputtype.extract_output_from_bins(bins)
+    if with_lower_bound:
+        bound, is_optimal = bounds.certificate(binsize, [valueof(item) for item in item_names], bins.num)
+        return output, bound, is_optimal
+    return output
 
 
 if __name__ == "__main__":
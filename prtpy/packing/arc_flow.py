@@ -0,0 +1,247 @@
+"""
+    Pack the numbers optimally by solving the arc-flow integer linear program of Valério de Carvalho (1999):
+        "Exact solution of bin-packing problems using column generation and branch-and-bound",
+        Annals of Operations Research 86, 629-659.
+
+    Every bin is a path from node 0 to node `binsize` in a graph whose nodes are the partial bin sums,
+    and whose arcs are items (d -> d+size) or unused capacity (d -> binsize).
+    The graph is built over the distinct item sizes only, so its size does not depend on the number of items.
+    It is compressed by the reductions of Valério de Carvalho:
+    the items in a bin are in descending order of size, and the copies of each size are consecutive.
+"""
+
+from typing import Callable, List, Any, Dict, Tuple
+from collections import defaultdict
+from math import inf
+import logging
+
+import numpy as np
+from scipy import sparse
+import mip
+
+from prtpy import Bins, BinsKeepingContents
+from prtpy import highs
+from prtpy.packing import first_fit
+
+logger = logging.getLogger(__name__)
+
+
+def optimal(
+    bins: Bins,
+    binsize: int,
+    items: List[Any],
+    valueof: Callable[[Any], int] = lambda x: x,
+    max_seconds: float = inf,
+    backend: str = "mip",
+    verbose: int = 0,
+) -> Bins:
+    """
+    Pack the given items into the smallest possible number of bins, using the arc-flow ILP.
+    The item sizes and the bin size must be integers.
+
+    :param max_seconds: stop the computation after this number of seconds have passed, and return the best packing found so far.
+    :param backend: "mip" to solve with python-mip (CBC by default), or "highs" to solve with HiGHS through scipy.optimize.milp.
+
+    >>> from prtpy.bins import BinsKeepingContents, BinsKeepingSums
+    >>> optimal(BinsKeepingContents(), binsize=9, items=[1,2,3,3,5,9,9]).bins
+    [[9], [9], [5, 3, 1], [3, 2]]
+    >>> optimal(BinsKeepingContents(), binsize=100, items=[99,94,79,64,50,44,43,37,32,19,18,7,3]).num
+    6
+    >>> optimal(BinsKeepingContents(), binsize=100, items=[99,94,79,64,50,44,43,37,32,19,18,7,3], backend="highs").num
+    6
+
+    FFD needs 4 bins for this example from Wikipedia, but 3 bins are enough:
+    >>> sorted(optimal(BinsKeepingSums(), binsize=61, items=[44, 24, 24, 22, 21, 17, 8, 8, 6, 6]).sums)
+    [60.0, 60.0, 60.0]
+
+    Many items with few distinct sizes (FFD needs 375 bins):
+    >>> optimal(BinsKeepingSums(), binsize=1000, items=300*[501, 252, 248]).num
+    350
+
+    >>> from prtpy import pack
+    >>> pack(algorithm=optimal, binsize=60, items={"a":44, "b":24, "c":24, "d":22, "e":21, "f":17, "g":8, "h":8, "i":6, "j":6})
+    [['a', 'g', 'h'], ['b', 'c', 'i', 'j'], ['d', 'e', 'f']]
+    """
+    items_by_size: Dict[int, List[Any]] = defaultdict(list)
+    for item in items:
+        value = valueof(item)
+        if value != int(value) or value < 0:
+            raise ValueError(f"Item {item} has size {value}, which is not a non-negative integer.")
+        if value > binsize:
+            raise ValueError(f"Item {item} has size {value} which is larger than the bin size {binsize}.")
+        items_by_size[int(value)].append(item)
+    if binsize != int(binsize):
+        raise ValueError(f"The bin size {binsize} is not an integer.")
+    binsize = int(binsize)
+
+    # Items of size 0 do not take any capacity; they are added to the first bin at the end.
+    zero_items = items_by_size.pop(0, [])
+    sizes = sorted(items_by_size.keys(), reverse=True)
+    demands = [len(items_by_size[size]) for size in sizes]
+
+    if backend == "mip":
+        solve = _solve_with_mip
+    elif backend == "highs":
+        solve = _solve_with_highs
+    else:
+        raise ValueError(f"Unknown ILP backend {backend}. Should be 'mip' or 'highs'.")
+
+    # The FFD packing is an upper bound, and the fallback if the solver finds no packing in time.
+    packing = first_fit.decreasing(BinsKeepingContents(), binsize, [size for size, demand in zip(sizes, demands) for _ in range(demand)]).bins
+    lower_bound = int(np.ceil(np.dot(sizes, demands) / binsize))
+    if len(packing) > lower_bound:
+        tails, heads, arc_sizes = build_graph(binsize, sizes, demands)
+        logger.info("Arc-flow graph with %d arcs for %d distinct sizes.", len(tails), len(sizes))
+        flows = solve(binsize, sizes, demands, tails, heads, arc_sizes, lower_bound, len(packing), max_seconds, verbose)
+        if flows is None:
+            logger.warning("The ILP solver found no packing in time; returning the FFD packing with %d bins.", len(packing))
+        else:
+            packing = decompose_flow(binsize, tails, heads, arc_sizes, flows)
+    if zero_items and not packing:
+        packing = [[]]
+
+    # Construct the output:
+    next_item = {size: iter(items_by_size[size]) for size in sizes}
+    bins.add_empty_bins(len(packing))
+    for ibin, bin_sizes in enumerate(packing):
+        for size in bin_sizes:
+            bins.add_item_to_bin(next(next_item[size]), ibin)
+    for item in zero_items:
+        bins.add_item_to_bin(item, 0)
+    return bins
+
+
+def build_graph(binsize: int, sizes: List[int], demands: List[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build the compressed arc-flow graph.
+    Returns three arrays: the tail, the head and the item size of each arc (size 0 for a loss arc).
+
+    :param sizes: the distinct item sizes, in descending order.
+    :param demands: the number of items of each size.
+
+    >>> tails, heads, arc_sizes = build_graph(10, [6, 4], [1, 2])
+    >>> list(zip(tails.tolist(), heads.tolist(), arc_sizes.tolist()))
+    [(0, 6, 6), (0, 4, 4), (4, 8, 4), (6, 10, 4), (4, 10, 0), (6, 10, 0), (8, 10, 0)]
+    """
+    reached = np.zeros(binsize + 1, dtype=bool)  # reached[d] is True if some bin prefix, with the larger sizes, sums to d.
+    reached[0] = True
+    tails, heads, arc_sizes = [], [], []
+    for size, demand in zip(sizes, demands):
+        # Arcs of this size start at nodes reached by the larger sizes, followed by at most `demand` copies of this size.
+        starts = np.flatnonzero(reached[: binsize - size + 1])
+        new_reached = reached.copy()
+        arcs_of_size = set()
+        for _ in range(min(demand, binsize // size)):
+            starts = starts[starts + size <= binsize]
+            if len(starts) == 0:
+                break
+            arcs_of_size.update(starts.tolist())
+            starts = starts + size
+            new_reached[starts] = True
+        arc_tails = np.array(sorted(arcs_of_size), dtype=int)
+        tails.append(arc_tails)
+        heads.append(arc_tails + size)
+        arc_sizes.append(np.full(len(arc_tails), size, dtype=int))
+        reached = new_reached
+    # Loss arcs: from every reached node directly to the last node.
+    loss_tails = np.flatnonzero(reached[1:binsize]) + 1
+    tails.append(loss_tails)
+    heads.append(np.full(len(loss_tails), binsize, dtype=int))
+    arc_sizes.append(np.zeros(len(loss_tails), dtype=int))
+    return np.concatenate(tails), np.concatenate(heads), np.concatenate(arc_sizes)
+
+
+def _solve_with_mip(binsize, sizes, demands, tails, heads, arc_sizes, lower_bound, upper_bound, max_seconds, verbose) -> np.ndarray:
+    model = mip.Model("arc-flow")
+    numbins = model.add_var(var_type=mip.INTEGER, lb=lower_bound, ub=upper_bound)
+    flows = [model.add_var(var_type=mip.INTEGER) for _ in range(len(tails))]
+    arcs_out, arcs_in = defaultdict(list), defaultdict(list)
+    arcs_of_size = defaultdict(list)
+    for arc, (tail, head, size) in enumerate(zip(tails, heads, arc_sizes)):
+        arcs_out[tail].append(flows[arc])
+        arcs_in[head].append(flows[arc])
+        arcs_of_size[size].append(flows[arc])
+    model.objective = mip.minimize(numbins)
+    for node in set(arcs_out.keys()) | set(arcs_in.keys()):
+        supply = numbins if node == 0 else -numbins if node == binsize else 0
+        model += mip.xsum(arcs_out[node]) - mip.xsum(arcs_in[node]) == supply
+    for size, demand in zip(sizes, demands):
+        model += mip.xsum(arcs_of_size[size]) == demand
+
+    model.verbose = verbose
+    status = model.optimize(max_seconds=max_seconds)
+    if status == mip.OptimizationStatus.FEASIBLE:
+        logger.warning("The ILP solver stopped before proving optimality: %g bins, lower bound %g.", model.objective_value, model.objective_bound)
+    elif status == mip.OptimizationStatus.NO_SOLUTION_FOUND:
+        return None
+    elif status != mip.OptimizationStatus.OPTIMAL:
+        raise ValueError(f"Problem status is not optimal - it is {status}.")
+    return np.array([int(round(flow.x)) for flow in flows], dtype=int)
+
+
+def _solve_with_highs(binsize, sizes, demands, tails, heads, arc_sizes, lower_bound, upper_bound, max_seconds, verbose) -> np.ndarray:
+    numarcs = len(tails)
+    model = highs.Model()
+    flows = model.add_vars(numarcs, integer=True)
+    (numbins,) = model.add_vars(1, lb=lower_bound, ub=upper_bound, integer=True)
+    # Flow conservation: out(node) - in(node) == numbins at node 0, -numbins at the last node, and 0 elsewhere.
+    model.add_sparse_constraints(
+        sparse.coo_matrix((
+            np.concatenate((np.ones(numarcs), -np.ones(numarcs), [-1, 1])),
+            (np.concatenate((tails, heads, [0, binsize])), np.concatenate((flows, flows, [numbins, numbins]))),
+        ), shape=(binsize + 1, model.num_vars)),
+        0, 0,
+    )
+    # Demand: the flow on the arcs of each size equals the number of items of that size.
+    item_arcs = np.flatnonzero(arc_sizes > 0)
+    size_index = {size: index for index, size in enumerate(sizes)}
+    model.add_sparse_constraints(
+        sparse.coo_matrix((
+            np.ones(len(item_arcs)),
+            (np.array([size_index[size] for size in arc_sizes[item_arcs]], dtype=int), flows[item_arcs]),
+        ), shape=(len(sizes), model.num_vars)),
+        demands, demands,
+    )
+    result = model.optimize(highs.LinearExpression({int(numbins): 1}), max_seconds=max_seconds, verbose=verbose)
+    if result.x is None:
+        if result.status == 1:  # the time ran out
+            return None
+        raise ValueError(f"Problem status is not optimal - it is {result.message}")
+    if result.status != 0:
+        logger.warning("The ILP solver stopped before proving optimality: %g bins, lower bound %g.", result.fun, result.mip_dual_bound)
+    return np.round(result.x[flows]).astype(int)
+
+
+def decompose_flow(binsize: int, tails: np.ndarray, heads: np.ndarray, arc_sizes: np.ndarray, flows: np.ndarray) -> List[List[int]]:
+    """
+    Decompose the flow into paths from node 0 to node binsize. Each path is a bin; returns the list of item sizes in each bin.
+    The bins are returned in descending lexicographic order, so that the bin with the largest item is first.
+
+    >>> tails, heads, arc_sizes = build_graph(10, [6, 4], [1, 2])
+    >>> decompose_flow(10, tails, heads, arc_sizes, np.array([1, 1, 1, 0, 0, 1, 1]))
+    [[6], [4, 4]]
+    """
+    remaining = flows.copy()
+    arcs_out = defaultdict(list)
+    for arc in np.flatnonzero(remaining > 0):
+        arcs_out[tails[arc]].append(arc)
+    packing = []
+    while arcs_out[0]:
+        node, bin_sizes = 0, []
+        while node != binsize:
+            arc = arcs_out[node][-1]
+            remaining[arc] -= 1
+            if remaining[arc] == 0:
+                arcs_out[node].pop()
+            if arc_sizes[arc] > 0:
+                bin_sizes.append(int(arc_sizes[arc]))
+            node = heads[arc]
+        packing.append(bin_sizes)
+    return sorted(packing, reverse=True)
+
+
+if __name__ == "__main__":
+    import doctest
+
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
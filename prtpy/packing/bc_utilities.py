@@ -6,38 +6,9 @@ Authors: Avshalom Avraham & Tehila Ben-Kalifa
 Since: 05-2022
 """
 import math
-from itertools import combinations, product
-from typing import List, Iterable
-import logging
-from prtpy.bins import Bins, BinsKeepingContents
-
-
-# A simple class to store a state of bins arrangement.
-# We keep the current bin arrangement and index of the next bin, as well as the items left to arrange in those bins.
-class BinBranch:
-    def __init__(self, items: List, bins: Bins, bin_index: int):
-        self.items = items
-        self.bins = bins
-        self.bin_index = bin_index
-
-
-# Returns a new list which is a copy of 'original' but without the items in 'to_remove' if they existed.
-def list_without_items(original: List, to_remove: Iterable) -> List:
-    output = original.copy()
-    for obj in to_remove:
-        if obj in output:
-            output.remove(obj)
-
-    return output
-
-
-# Returns a new list which is a copy of 'lst' but without duplicate items.
-def unique_list(lst: List) -> List:
-    output = []
-    for element in lst:
-        if element not in output:
-            output.append(element)
-    return output
+from functools import lru_cache
+from typing import List, Tuple
+import logging, time
 
 
 # Calculates the lower bound of bins for bin packing problem.
@@ -47,90 +18,6 @@ def lower_bound(binsize: float, items: List) -> float:
     return math.ceil(sum(items) / binsize)
 
 
-# Calculates the L2 lower bound using Martello and Toth algorithm.
-# See article for details.
-def l2_lower_bound(binsize: float, items: List) -> float:
-    copy_items = items.copy()
-
-    copy_items.sort(reverse=True)
-
-    total_sum = sum(copy_items)
-    estimated_waste = 0
-    capacity = binsize
-
-    for x in copy_items:
-        # 'r' is the residual capacity in a bin.
-        r = capacity - x
-
-        # We need to find all the items smaller than r
-        smaller_elements = []
-
-        # We go through the items from end to beginning because they are sorted.
-        for i in range(len(copy_items) - 1, 0, -1):
-            if copy_items[i] > r:
-                break
-            smaller_elements.append(copy_items[i])
-
-        # See article for details about conditions
-        s = sum(smaller_elements)
-        if s == r:
-            for element in smaller_elements:
-                copy_items.remove(element)
-            capacity = binsize
-        elif s < r:
-            estimated_waste += r - s
-            for element in smaller_elements:
-                copy_items.remove(element)
-            capacity = binsize
-        else:
-            for element in smaller_elements:
-                copy_items.remove(element)
-            capacity = binsize - (s - r)
-
-    return (estimated_waste + total_sum) / binsize
-
-
-# Calculates the L3 lower bound using Martello and Toth algorithm.
-# See article for details.
-def l3_lower_bound(binsize: float, items: List) -> float:
-    copy_items = items.copy()
-    best_lower_bound = l2_lower_bound(binsize, copy_items)
-
-    # We successively prune the smallest element and calculate L2 lower bound each time.
-    # At the end we return the highest lower bound.
-    for i in range(len(items)):
-        copy_items.remove(min(copy_items))
-        new_l2 = l2_lower_bound(binsize, copy_items)
-        if new_l2 > best_lower_bound:
-            best_lower_bound = new_l2
-
-    return best_lower_bound
-
-
-# A function that creates all possible arrangements of items in 'num_of_sublists' lists.
-# For example: find_all_bin_arrangements(range(2), 2) => [[0,1],[]], [[0],[1]], [[1], [0]], etc......
-def find_all_bin_arrangements(items: List, num_of_sublists: int):
-    for locs in product(range(num_of_sublists), repeat=len(items)):
-        output = [[] for _ in range(num_of_sublists)]
-        for elem, loc in zip(items, locs):
-            output[loc].append(elem)
-        yield output
-
-
-# A function that gets a list of 'n' numbers and an arrangement in length 'n',
-# and checks if each list in the arrangement fits the corresponding item in the same index
-def check_fits(items: List[int], arrangement: List[List]):
-    if len(items) != len(arrangement):
-        raise ValueError(f"items list ({len(items)}) and arrangement ({len(arrangement)}) are not in the same size")
-
-    for i in range(len(items)):
-        if sum(arrangement[i]) > items[i]:
-            return False
-
-    # Return true if each of the lists in the arrangement fits the size of the item in the same index
-    return True
-
-
 def is_dominant(list1: List, list2: List):
     """
             Test 1:
@@ -164,34 +51,79 @@ def is_dominant(list1: List, list2: List):
             Test 8:
             >>> is_dominant([9,7,3,1], [10,8,6,4,2])
             False
+
+            Test 9: each item of list1 can contain one item of list2 only
+            >>> is_dominant([5], [5,5])
+            False
+
+            Test 10: needs the exact search
+            >>> is_dominant([6,6,6], [4,4,3,3,2,2])
+            True
         """
 
-    # If list2 is empty - everything dominates it. return True.
-    # If list2 is NOT empty and list1 IS empty - list1 can't dominate list2. return False.
-    if not list2:
+    # The test depends only on the sorted lists, so it is memoised on them.
+    return _is_dominant(tuple(sorted(list1, reverse=True)), tuple(sorted(list2, reverse=True)))
+
+
+# The maximum number of search nodes in the exact test of _is_dominant.
+# If it is exceeded, the answer is False, which is always safe: a completion is kept unless it is proved to be dominated.
+DOMINANCE_SEARCH_NODES = 10000
+
+
+@lru_cache(maxsize=1 << 16)
+def _is_dominant(capacities: tuple, items: tuple) -> bool:
+    """
+    Checks if the items can be packed into bins whose capacities are the given capacities. Both are in descending order.
+
+    >>> _is_dominant((5,), (5, 5)), _is_dominant((6, 4), (3, 3, 2, 2)), _is_dominant((7, 3), (5, 5))
+    (False, True, False)
+    """
+    # If there are no items - everything dominates them. If the largest item or the total does not fit - nothing fits.
+    if not items:
         return True
-    elif not list1:
+    if not capacities or capacities[0] < items[0] or sum(items) > sum(capacities):
         return False
 
-    # If list2 is a sublist of list1
-    if all(x in list1 for x in list2):
+    # Greedy matching: the i-th largest item fits into the i-th largest capacity. This includes the case of a sub-list.
+    if len(items) <= len(capacities) and all(item <= capacity for item, capacity in zip(items, capacities)):
         return True
 
-    # If the largest item in list2 does not fit the largest item in list1 - list1 can't dominate list2
-    if list1[0] < list2[0]:
-        return False
+    # First-fit decreasing of the items into the capacities.
+    residuals = list(capacities)
+    for item in items:
+        for i in range(len(residuals)):
+            if item <= residuals[i]:
+                residuals[i] -= item
+                break
+        else:
+            break
+    else:
+        return True
 
-    # Create all possible arrangements of list2 in len(list1) 'bins'.
-    # If found an arrangement that can be fitted perfectly in list1 items (assuming each item is a bin) - return True
-    for arrangement in find_all_bin_arrangements(list2, len(list1)):
-        if check_fits(list1, arrangement):
-            return True
+    # An exact, bounded search for a packing of the items into the capacities.
+    return _fits_into(list(capacities), items, 0, [DOMINANCE_SEARCH_NODES])
 
-    return False
 
+def _fits_into(residuals: List, items: tuple, index: int, budget: List[int]) -> bool:
+    if index == len(items):
+        return True
+    budget[0] -= 1
+    if budget[0] < 0:
+        return False
+    item = items[index]
+    tried = set()  # bins with the same residual capacity are equivalent.
+    for i in range(len(residuals)):
+        if item <= residuals[i] and residuals[i] not in tried:
+            tried.add(residuals[i])
+            residuals[i] -= item
+            fits = _fits_into(residuals, items, index + 1, budget)
+            residuals[i] += item
+            if fits:
+                return True
+    return False
 
 
-def check_for_dominance(completions: List[List]):
+def check_for_dominance(completions: List[List], deadline: float = math.inf):
     """
             Test 1:
             >>> check_for_dominance([[3], [2], [1]])
@@ -214,78 +146,38 @@ def check_for_dominance(completions: List[List]):
     if len(completions) <= 1:
         return completions
 
-    # We are going to collect all the dominated completions and then remove them from the original completion list
-    dominated_completions = []
+    # We mark the dominated completions and then remove them from the original completion list
+    dominated = [False] * len(completions)
 
     for i in range(len(completions) - 1):
-        list1 = completions[i]
-        if list1 in dominated_completions:
+        if deadline < math.inf and time.perf_counter() >= deadline:
+            raise TimeoutError("The time ran out while checking the bin completions for dominance.")
+        if dominated[i]:
             continue
+        list1 = completions[i]
 
         for j in range(i+1, len(completions)):
-            list2 = completions[j]
-            if list2 in dominated_completions:
+            if dominated[j]:
                 continue
+            list2 = completions[j]
 
-            # If list1 dominates list2 - append list2 to the dominated completions and continue to the next iteration
+            # If list1 dominates list2 - mark list2 as dominated and continue to the next iteration
             if is_dominant(list1, list2):
-                dominated_completions.append(list2)
+                dominated[j] = True
                 continue
 
-            # Else - if list2 dominates list1 - append list1 to the dominated completions and break (for a new list1)
+            # Else - if list2 dominates list1 - mark list1 as dominated and break (for a new list1)
             if is_dominant(list2, list1):
-                dominated_completions.append(list1)
+                dominated[i] = True
                 break
 
             # If list1 nor list1 is dominated - continue for the next list2 without doing anything
 
     # Remove dominated lists from completions and return them ordered by their sum.
-    output_list = list_without_items(completions, dominated_completions)
+    output_list = [completion for completion, is_dominated in zip(completions, dominated) if not is_dominated]
     return sorted(output_list, key=sum, reverse=True)
 
 
-# Returns a list of the pairs undominated by y (highest element that fits the bin with x).
-# See article for details.
-def find_undominated_pairs(constant_elements_sum: int, y: int, items: List, binsize: int) -> List:
-    """
-            Test 1:
-            >>> find_undominated_pairs(94, 3, [79,64,50,44,43,37,32,19,18,7,3], 100)
-            []
-
-            Test 2:
-            >>> find_undominated_pairs(79, 19, [79,64,50,44,43,37,32,19,18,7,3], 100)
-            [[18, 3]]
-
-            Test 3:
-            >>> find_undominated_pairs(64, 32, [50,44,43,37,32,19,18,7], 100)
-            []
-
-            Test 4:
-            >>> find_undominated_pairs(50, 44, [44,43,37,32,18,7], 100)
-            [[43, 7], [32, 18]]
-
-            Test 5:
-            >>> find_undominated_pairs(44, 43, [43,37,18,7], 100)
-            [[43, 7], [37, 18]]
-        """
-    start = 0
-    end = len(items) - 1
-    undominated_pairs = []
-
-    while (start < end):
-        sum = items[start] + items[end]
-        if constant_elements_sum + sum > binsize:
-            start += 1
-        elif sum <= y:
-            end -= 1
-        else:
-            undominated_pairs.append([items[start], items[end]])
-            start += 1
-            end -= 1
-
-    return undominated_pairs
-
-
 # Returns all the possible completions of undominated items for the bin containing x.
 # See article for details.
 def find_bin_completions(x: int, items: List, binsize: int):
@@ -312,7 +204,7 @@ def find_bin_completions(x: int, items: List, binsize: int):
 
         Test 6:
         >>> find_bin_completions(81, [59, 58, 55, 50, 43, 22, 21, 20, 15, 14, 10, 8, 6, 5, 4, 3, 1], 100)
-        [[10, 6, 3], [15, 4], [14, 5], [10, 8, 1]]
+        [[15, 4], [14, 5], [10, 8, 1], [10, 6, 3]]
 
         Test 7:
         >>> find_bin_completions(85, [5, 4, 3, 2, 1], 100)
@@ -323,48 +215,138 @@ def find_bin_completions(x: int, items: List, binsize: int):
         logging.info(f"Items list is empty.")
         return []
 
-    # We find the largest element y for which (x+y) <= binsize.
-    y = next((item for item in items if x + item <= binsize), 0)
+    sizes, counts = multiset(items)
+    return find_multiset_completions(x, sizes, counts, binsize)
+
+
+# Returns the distinct sizes of the given items in descending order, and the number of copies of each size.
+def multiset(items: List) -> Tuple[List, List[int]]:
+    """
+        >>> multiset([3, 5, 3, 1, 5, 5])
+        ([5, 3, 1], [3, 2, 1])
+        >>> multiset([])
+        ([], [])
+    """
+    sizes, counts = [], []
+    for item in sorted(items, reverse=True):
+        if sizes and sizes[-1] == item:
+            counts[-1] += 1
+        else:
+            sizes.append(item)
+            counts.append(1)
+    return sizes, counts
+
+
+# Returns all the possible completions of undominated items for the bin containing x,
+# where the other items are given as distinct sizes (in descending order) and the number of copies of each size.
+def find_multiset_completions(x: int, sizes: List, counts: List[int], binsize: int, deadline: float = math.inf):
+    """
+        >>> find_multiset_completions(79, [64, 50, 19, 18, 7, 3], [1, 1, 1, 1, 1, 1], 100)
+        [[18, 3], [19]]
+        >>> find_multiset_completions(40, [30, 20, 10], [0, 4, 5], 100)
+        [[20, 20, 20]]
+        >>> find_multiset_completions(95, [10, 8], [2, 1], 100)
+        []
+    """
+    capacity = binsize - x
 
     # No element fits the bin with x.
-    if y == 0:
+    if not any(count > 0 and size <= capacity for size, count in zip(sizes, counts)):
         logging.info(f"No other element fits with {x}.")
         return []
 
-    # The largest element is always undominated because no other element can contain it.
-    found_completions = [[y]]
-
-    # We go through all combinations of items subsets of all sizes, that fits the bin containing x.
-    for i in range(len(items) + 1):
-        feasible_completions = filter(lambda s: x + sum(s) <= binsize, combinations(items, i))
-
-        # For every subset that fits the bin containing x, we find undominated pair of items to add to our completions.
-        # When we take subset of size 1 and find a pair, it's like finding a triplet.
-        # When we take subset of size 2 and find a pair, it's like finding a quadruple etc.
-        for fc in feasible_completions:
-            constant_elements_sum = x + sum(fc)
-            items_left = list_without_items(items, fc)
-            undominated_pairs = find_undominated_pairs(constant_elements_sum, y, items_left, binsize)
-
-            # We add the undominated pairs to possible completions.
-            # if none were found - we add the subset fc as a possible completions.
-            if undominated_pairs:
-                # We unite each pair with the constant elements we found.
-                for pair in undominated_pairs:
-                    pair.extend(fc)
-                    pair.sort(reverse=True)
-                    found_completions.append(pair)
-                found_completions.extend(undominated_pairs)
-
-            elif fc:
-                # If we found a correct completion with no other undominated pairs - we add it to our list
-                found_completions.append(list(fc))
-
-    # Create all possible completions without duplicates, sorted in descending order by their sum.
-    uniq_lst = unique_list(sorted(found_completions, key=sum, reverse=True))
-
-    # Return the result after checking for dominance between the possible completions
-    return check_for_dominance(uniq_lst)
+    # remaining[i] is the total size of the copies of sizes[i], sizes[i+1], ...
+    remaining = [0] * (len(sizes) + 1)
+    for i in range(len(sizes) - 1, -1, -1):
+        remaining[i] = remaining[i + 1] + sizes[i] * counts[i]
+    found_completions = []
+    _generate_completions(sizes, counts, remaining, 0, capacity, [], [], math.inf, found_completions, deadline)
+
+    # Return the result after checking for dominance between the possible completions, sorted in descending order by their sum.
+    return check_for_dominance(sorted(found_completions, key=sum, reverse=True), deadline)
+
+
+def _generate_completions(sizes: List, counts: List[int], remaining: List, start: int, capacity: float, included: List, excluded: List, min_gap: float, output: List, deadline: float = math.inf):
+    """
+    Korf's recursive generator of completions, over the distinct sizes (in descending order):
+    for each size, it includes every possible number of copies, from the largest number that fits down to zero,
+    and a completion is output only if it passes three dominance rules:
+     * It is maximal: no excluded item fits into its free capacity.
+     * No included item a can be swapped for a larger excluded item e, that is, e - a is larger than the free capacity.
+     * No pair of included items a, b can be swapped for an excluded item e >= a + b, that is, e - a - b is larger than the free capacity.
+    excluded is the list of the excluded sizes so far (in descending order), and min_gap is the smallest excluded item,
+    difference e - a or difference e - a - b so far. min_gap only decreases, and the free capacity of a completion in this branch
+    is at least the capacity minus the total size remaining[start] of the items that are left, so the branch is pruned once this is at least min_gap.
+    The copies that do not fit are not excluded, since they can never be added. Since copies are counted rather than listed,
+    each completion is generated once, even when there are many items of the same size.
+    There may be exponentially many completions; if the deadline (by time.perf_counter()) passes, a TimeoutError is raised.
+
+    >>> output = []
+    >>> _generate_completions([19, 18, 7, 3], [1, 1, 1, 1], [47, 28, 10, 3, 0], 0, 21, [], [], math.inf, output)
+    >>> output
+    [[19], [18, 3]]
+
+    The pair rule: [4, 3] is dominated by [9], since 4 + 3 <= 9 and 9 - 4 - 3 is at most the free capacity 3.
+    >>> output = []
+    >>> _generate_completions([9, 4, 3], [1, 1, 1], [16, 7, 3, 0], 0, 10, [], [], math.inf, output)
+    >>> output
+    [[9]]
+    >>> output = []
+    >>> _generate_completions([7, 3], [3, 5], [36, 15, 0], 0, 20, [], [], math.inf, output)
+    >>> output
+    [[7, 7, 3, 3]]
+    """
+    if deadline < math.inf and time.perf_counter() >= deadline:
+        raise TimeoutError("The time ran out while generating the bin completions.")
+    # Skip the sizes that do not fit, or have no copies left.
+    while start < len(sizes) and (counts[start] == 0 or sizes[start] > capacity):
+        start += 1
+    # Even with all the remaining items, some excluded item (or a swap) would fit into the free capacity.
+    if capacity - remaining[start] >= min_gap:
+        return
+    if start == len(sizes):
+        if included:
+            output.append(list(included))
+        return
+
+    size = sizes[start]
+    max_copies = counts[start] if size == 0 else min(counts[start], int(capacity // size))
+    for copies in range(max_copies, -1, -1):
+        gap = min_gap
+        if copies > 0 and excluded:
+            gap = min(gap, excluded[-1] - size, _pair_gap(excluded, included, size, copies))
+        included.extend([size] * copies)
+        if copies < max_copies:  # a copy that fits is excluded.
+            excluded.append(size)
+            _generate_completions(sizes, counts, remaining, start + 1, capacity - copies * size, included, excluded, min(gap, size), output, deadline)
+            excluded.pop()
+        else:
+            _generate_completions(sizes, counts, remaining, start + 1, capacity - copies * size, included, excluded, gap, output, deadline)
+        del included[len(included) - copies:]
+
+
+def _pair_gap(excluded: List, included: List, size: float, copies: int) -> float:
+    """
+    The smallest difference e - a - b, over the pairs of an item a of the given size and another included item b
+    (one of the previously included items, or another copy of the size), and the smallest excluded item e >= a + b.
+
+    >>> _pair_gap([20, 12], [10], 7, 1), _pair_gap([20, 12], [10], 5, 2), _pair_gap([20, 12], [], 7, 1)
+    (3, 2, inf)
+    """
+    partners = set(included)
+    if copies >= 2:
+        partners.add(size)
+    gap = math.inf
+    for partner in partners:
+        pair = size + partner
+        if size > 0 and partner > 0:
+            # The excluded sizes are in descending order, so the smallest one that is at least the pair is found from the end.
+            index = len(excluded) - 1
+            while index >= 0 and excluded[index] < pair:
+                index -= 1
+            if index >= 0:
+                gap = min(gap, excluded[index] - pair)
+    return gap
 
 
 if __name__ == "__main__":
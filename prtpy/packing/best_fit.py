@@ -3,7 +3,10 @@
 """
 
 from typing import Callable, List, Any
+from bisect import bisect_left, insort
+from math import inf
 from prtpy import outputtypes as out, Bins
+from prtpy.packing.first_fit import copies_that_fit
 
 
 def online(
@@ -26,23 +29,33 @@ def online(
         """
 
     bins.add_empty_bins()
-    for item in items:
-        value = valueof(item)
+    open_bins = SortedSums(bins.sums[:bins.num])
+    items = list(items)
+    values = [valueof(item) for item in items]
+    start = 0
+    while start < len(items):
+        value = values[start]
         if value > binsize:
-            raise ValueError(f"Item {item} has size {value} which is larger than the bin size {binsize}.")
-        ibin = 0
-        best_bin = (-1, -1)
-        while ibin < bins.num:
-            new_sum = bins.sums[ibin] + value
-            if new_sum <= binsize and new_sum > best_bin[1]:
-                best_bin = (ibin, new_sum)
-            ibin += 1
-
-        if best_bin[0] > -1:
-            bins.add_item_to_bin(item, best_bin[0])
-        else:  # if not added to any bin
-            bins.add_empty_bins(1)
-            bins.add_item_to_bin(item, ibin)
+            raise ValueError(f"Item {items[start]} has size {value} which is larger than the bin size {binsize}.")
+        # After a copy of an item is added to the best bin, that bin is still the best for the next copy, if it fits.
+        # So a run of items with the same value fills the best bin with as many copies as fit, then the next best one.
+        end = start + 1
+        while end < len(items) and values[end] == value:
+            end += 1
+        while start < end:
+            ibin = open_bins.best_fit(value, binsize)
+            if ibin is None:  # if not added to any bin
+                bins.add_empty_bins(1)
+                ibin = bins.num - 1
+                open_bins.append(bins.sums[ibin])
+            old_sum = bins.sums[ibin]
+            count = copies_that_fit(old_sum, value, binsize, end - start)
+            if count == 1:
+                bins.add_item_to_bin(items[start], ibin)
+            else:
+                bins.add_items_to_bin(items[start : start + count], ibin, total=count * value)
+            open_bins.update(ibin, old_sum, bins.sums[ibin])
+            start += count
     return bins
 
 
@@ -52,7 +65,18 @@ def decreasing(
     items: List[any],
     valueof: Callable[[Any], float] = lambda x: x,
 ):
+    """
+        Pack the given items into bins using the best-fit-decreasing algorithm.
+        It sorts the items by descending value, and then runs best-fit.
+
+        >>> from prtpy.bins import BinsKeepingContents, BinsKeepingSums
+        >>> decreasing(BinsKeepingContents(), binsize=9, items=[4,7,2,1,5,8,4]).bins
+        [[8, 1], [7, 2], [5, 4], [4]]
 
+        The copies of each size are packed a bin at a time, so many items with few distinct sizes are fast:
+        >>> decreasing(BinsKeepingSums(), binsize=1000, items=[248]*10**4 + [501]*10**4 + [252]*10**4).num
+        12500
+        """
     return online(
         bins,
         binsize,
@@ -61,6 +85,56 @@ def decreasing(
     )
 
 
+class SortedSums:
+    """
+    The bin sums, kept as (sum, bin-index) pairs in a sorted list, for finding the best bin for an item by binary search.
+    The best bin is the one with the largest sum that still fits the item; among equal sums, the one with the smallest index.
+
+    >>> sorted_sums = SortedSums([5, 2, 7])
+    >>> sorted_sums.best_fit(1, binsize=9), sorted_sums.best_fit(4, binsize=9), sorted_sums.best_fit(8, binsize=9)
+    (2, 0, None)
+    >>> sorted_sums.update(1, 2, 5)
+    >>> sorted_sums.best_fit(4, binsize=9)
+    0
+    """
+
+    def __init__(self, sums: List[float] = ()):
+        self.keys = sorted((float(bin_sum), ibin) for ibin, bin_sum in enumerate(sums))
+
+    def append(self, bin_sum: float):
+        insort(self.keys, (float(bin_sum), len(self.keys)))
+
+    def update(self, ibin: int, old_sum: float, new_sum: float):
+        del self.keys[bisect_left(self.keys, (float(old_sum), ibin))]
+        insort(self.keys, (float(new_sum), ibin))
+
+    def best_fit(self, value: float, binsize: float) -> int:
+        """
+        The index of the bin with the largest sum plus the given value that is at most binsize, or None if there is no such bin.
+        Like the linear scan, it compares the rounded sums sum+value, so that it gives the same bin also for float sizes.
+        """
+        keys = self.keys
+        # The bins whose sum fits the value are a prefix of keys, since rounding is monotone; find its end by binary search.
+        low, high = 0, len(keys)
+        while low < high:
+            middle = (low + high) // 2
+            if keys[middle][0] + value <= binsize:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return None
+        best_sum = keys[low - 1][0] + value
+        # The first pair with this sum has the smallest index. Smaller sums may round to the same sum+value, so check them too.
+        best_bin = inf
+        end = low
+        while end > 0 and keys[end - 1][0] + value == best_sum:
+            start = bisect_left(keys, (keys[end - 1][0], -1), 0, end)
+            best_bin = min(best_bin, keys[start][1])
+            end = start
+        return best_bin
+
+
 if __name__ == "__main__":
     import doctest
 
@@ -6,18 +6,26 @@
     Since: 05-2022
 """
 
-from typing import Callable, Any
-from prtpy.packing import best_fit
-from prtpy.packing.bc_utilities import *
+from collections import Counter, OrderedDict
+from typing import Callable, Any, Dict, List, Tuple
+import copy, logging, multiprocessing, os, time
 from functools import partial
-import copy
-from prtpy.bins import BinsKeepingContents
+import numpy as np
+from prtpy.packing import best_fit, bounds
+from prtpy.packing.bc_utilities import *
+from prtpy.bins import Bins, BinsKeepingContents
+from prtpy.incumbent import Incumbent
 
 def bin_completion(
         bins: Bins,
         binsize: float,
         items: List[any],
-        valueof: Callable[[Any], float] = lambda x: x
+        valueof: Callable[[Any], float] = lambda x: x,
+        cache: "CompletionCache" = None,
+        time_in_seconds: float = np.inf,
+        max_nodes: float = np.inf,
+        callback: Callable[[Incumbent], None] = None,
+        processes: int = 1,
 ) -> Bins:
     """
     "A New Algorithm for Optimal Bin Packing", by Richard E. Korf (2002).
@@ -50,6 +58,31 @@ def bin_completion(
     Example 6: Article Example #3
     >>> bin_completion(BinsKeepingContents(), binsize=100, items=[99, 97, 94, 93, 8, 5, 4, 2]).bins
     [[99], [97, 2], [94, 5], [93, 4], [8]]
+
+    The search is anytime: it starts from the BFD packing, and when the time or the node budget runs out,
+    it returns the best packing found so far. Each improved packing is reported to the callback, as an Incumbent
+    whose lower bound is the L3 bound of Martello and Toth (or L2, if the time ran out before L3 was computed);
+    the last call reports whether the packing was proved optimal.
+    >>> reports = []
+    >>> items = [99, 94, 79, 64, 50, 44, 43, 37, 32, 19, 18, 7, 3]
+    >>> bin_completion(BinsKeepingContents(), binsize=100, items=items, callback=reports.append).num
+    6
+    >>> [(report.objective_value, report.lower_bound, report.is_optimal) for report in reports]
+    [(7, 6, False), (6, 6, True)]
+    >>> bin_completion(BinsKeepingContents(), binsize=100, items=items, max_nodes=0, callback=reports.append).num
+    7
+    >>> reports[-1].objective_value, reports[-1].lower_bound, reports[-1].is_optimal, reports[-1].gap
+    (7, 6, False, 0.14285714285714285)
+
+    :param cache: a CompletionCache, that may be shared between calls; by default, a new cache is used for each call.
+    :param time_in_seconds: stop the search after this number of seconds, and return the best packing found so far.
+    :param max_nodes: stop the search after this number of nodes (bins tried), and return the best packing found so far.
+    :param callback: if given, it is called with an Incumbent (a packing with its number of bins, a lower bound and the gap)
+           whenever a better packing is found, starting with the BFD packing.
+    :param processes: if larger than 1, and the search tree is large, it is split between this number of worker processes (see parallel_search).
+
+    >>> bin_completion(BinsKeepingContents(), binsize=100, items=items, processes=2).num
+    6
     """
     # Test if there is an item which is not a number OR larger than binsize.
     for item in items:
@@ -58,106 +91,427 @@ def bin_completion(
 
     # Remove zeros from items as they are irrelevant.
     items = list(filter((0).__ne__, items))
+    if not items:
+        return bins
+
+    deadline = time.perf_counter() + time_in_seconds
+    empty_bins = copy.deepcopy(bins) if callback is not None else None
+
+    def report(packing: List[List[int]], lower_bound: int):
+        if callback is not None:
+            callback(Incumbent(_fill_bins(copy.deepcopy(empty_bins), packing), len(packing), lower_bound, len(packing) == lower_bound))
 
     # Find the BFD solution and check if it's optimal using the lower bound calculation.
+    # L2 takes O(n log n) time; it is tightened to L3 only if BFD does not attain it, and the time has not run out.
     bfd_solution = best_fit.decreasing(BinsKeepingContents(), binsize, items.copy())
-    lb = lower_bound(binsize, items)
+    lb = bounds.l2(binsize, items)
+    if bfd_solution.num > lb and time.perf_counter() < deadline:
+        lb = bounds.l3(binsize, items)
+    report(bfd_solution.bins, lb)
 
-    # If the BFD solution is optimal - return it.
+    # If the BFD solution is optimal - return it. Otherwise, it is the best solution so far, and we search for a better one.
     if bfd_solution.num == lb:
         logging.info(f"BFD has returned an optimal solution with {lb} bins.")
-        bins = bfd_solution
-        return bfd_solution
-
-    # We keep the BFD solution as the best solution so far and sort the items in descending order.
-    best_solution_so_far = bfd_solution
-    sorted_items = sorted(items, reverse=True)
-
-    # We create our main branch which will be the first arrangement with empty bins and index 0.
-    # Every branch will be a certain state of bin arrangements and items left to arrange.
-    # If we finished working on a branch, and we didn't get a good solution, we move on to the next branch.
-    main_branch = BinBranch(sorted_items, bins, bin_index=0)
-    branches = [main_branch]
-
-    while branches:
-        # cb = current branch
-        cb = branches.pop(0)
-
-        for x in cb.items:
-            # Add a new bin and add x to that bin
-            cb.bins.add_empty_bins()
-            cb.bins.add_item_to_bin(x, cb.bin_index)
-
-            # Now we consider all items except for x.
-            # We generate all possible completions for the bin containing x, sorted by their sum in descending order.
-            updated_list = cb.items[1:]
-            possible_undominated_completions = find_bin_completions(x, updated_list, binsize)
-
-            # If we found only 1 possible completion - we add it to the bin and remove it from the updated item list.
-            if len(possible_undominated_completions) == 1:
-                for item in possible_undominated_completions[0]:
-                    cb.bins.add_item_to_bin(item, cb.bin_index)
-                    updated_list.remove(item)
-
-            # If we found more than 1 possible completion:
-            elif len(possible_undominated_completions) > 1:
-                # We add all the completions from index 1 to end as branches for later.
-                # We create a new copy of bins and items left according to that specific completion.
-                # Then we add that copies to a new branches.
-                for completion in possible_undominated_completions[1:]:
-                    new_items = list_without_items(updated_list, completion)
-                    new_bins = copy.deepcopy(cb.bins)
-
-                    # list(map(partial(new_bins.add_item_to_bin, bin_index=new_bins.bin_index), completion))
-                    for item in completion:
-                        new_bins.add_item_to_bin(item, cb.bin_index)
-
-                    # We can calculate the partial lower bound in O(1) and pass on the branch if we are working on
-                    # a solution that is worse than our best solution so far.
-                    partial_lower_bound = new_bins.num + (sum(new_items) / binsize)
-                    if partial_lower_bound >= best_solution_so_far.num:
-                        logging.info(
-                            f"Redundant branch. partial lower bound - {partial_lower_bound}, exceeds or equals best lower "
-                            f"bound found so far -  {best_solution_so_far.num}.")
-                    else:
-                        branches.append(BinBranch(new_items, new_bins, cb.bin_index + 1))
-
-                # We add the first completions (with the largest sum) to our current branch.
-                for item in possible_undominated_completions[0]:
-                    cb.bins.add_item_to_bin(item, cb.bin_index)
-                    updated_list.remove(item)
-
-            # We finished with the current bin, and we move on to the next bin.
-            cb.bin_index += 1
-
-            # We need to update the current branch items
-            cb.items = updated_list
-
-            # We can calculate the partial lower bound in O(1) and prune the branch if we are working on a solution that
-            # is worse than our best solution so far.
-            partial_lower_bound = cb.bins.num + (sum(updated_list) / binsize)
-            if partial_lower_bound >= best_solution_so_far.num:
-                logging.info(
-                    f"branch pruned. partial lower bound - {partial_lower_bound}, exceeds or equals best lower "
-                    f"bound found so far -  {best_solution_so_far.num}.")
-                break
+        packing = bfd_solution.bins
+    else:
+        search = depth_first_search if processes <= 1 else partial(parallel_search, processes=processes)
+        packing, is_complete = search(
+            binsize, sorted(items, reverse=True), lb, bfd_solution.num, cache=cache, deadline=deadline, max_nodes=max_nodes,
+            on_improvement=lambda packing: report(packing, lb)
+        )
+        if packing is None:
+            packing = bfd_solution.bins
+        if is_complete:
+            logging.info(f"Found an optimal solution with {len(packing)} bins.")
+            if len(packing) > lb:  # the search proved that there is no packing with fewer bins.
+                report(packing, len(packing))
+        else:
+            logging.warning(f"The bin-completion search stopped before proving optimality: {len(packing)} bins, lower bound {lb}.")
+
+    return _fill_bins(bins, packing)
+
+
+def _fill_bins(bins: Bins, packing: List[List[int]]) -> Bins:
+    bins.add_empty_bins(len(packing))
+    for ibin, bin_items in enumerate(packing):
+        bins.add_items_to_bin(bin_items, ibin)
+    return bins
+
+
+class CompletionCache:
+    """
+    A least-recently-used cache of the undominated completions of a bin.
+    The completions of the bin of x depend only on x and on the remaining items that fit with it,
+    so the same question recurs in many branches of the search, and across calls with similar items.
+    The hits and misses counters can be used to tune maxsize.
+
+    >>> cache = CompletionCache(maxsize=100)
+    >>> items = [99, 94, 79, 64, 50, 44, 43, 37, 32, 19, 18, 7, 3]
+    >>> bin_completion(BinsKeepingContents(), binsize=100, items=items, cache=cache).num
+    6
+    >>> cache.hits, cache.misses
+    (0, 6)
+    >>> bin_completion(BinsKeepingContents(), binsize=100, items=items, cache=cache).num
+    6
+    >>> cache.hits, cache.misses
+    (6, 6)
+    """
 
-            # If we have to items to arrange we are done with this branch.
-            if not cb.items:
-                break
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def completions(self, x: int, sizes: List[int], counts: List[int], binsize: int, deadline: float = np.inf) -> List[List[int]]:
+        """
+        The undominated completions of the bin of x, computed by find_multiset_completions if they are not in the cache.
+        If no item fits with x, returns a single empty completion.
+        Raises TimeoutError if the deadline passes while they are computed; then nothing is cached.
+        """
+        capacity = binsize - x
+        key = (binsize, x, tuple((size, count) for size, count in zip(sizes, counts) if count > 0 and size <= capacity))
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.misses += 1
+        completions = find_multiset_completions(x, sizes, counts, binsize, deadline) or [[]]
+        self._entries[key] = completions
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return completions
+
+
+class SearchNode:
+    """
+    A node in the bin-completion search tree: the bin of the largest remaining item x, and its completions to try.
+    The remaining items are kept as a multiset: the number of copies of each distinct size.
+    The nogoods are multisets of items, such that a bin containing one of them cannot lead to a better packing (see depth_first_search).
+    """
 
-        # If we completed an arrangement successfully, and it's better than the best solution we had - update it.
-        if not cb.items and cb.bins.num < best_solution_so_far.num:
-            logging.info(f"Updated best solution from {best_solution_so_far.num} bins to {cb.bins.num} bins.")
-            best_solution_so_far = cb.bins
+    def __init__(self, binsize: int, sizes: List[int], counts: List[int], items_sum: int, cache: CompletionCache, nogoods: List[Counter], deadline: float = np.inf):
+        first = next(i for i, count in enumerate(counts) if count > 0)
+        self.x = sizes[first]
+        self.counts = list(counts)
+        self.counts[first] -= 1
+        self.items_sum = items_sum - self.x
+        # All the undominated completions of the bin containing x, sorted by their sum in descending order.
+        # If no item fits with x, its bin contains only x.
+        self.completions = cache.completions(self.x, sizes, self.counts, binsize, deadline)
+        self.next_completion = 0
+        self.nogoods = nogoods
+        self.explored = []  # the completions whose subtrees were searched, as multisets.
+
+
+def depth_first_search(
+        binsize: int,
+        sorted_items: List[int],
+        lb: int,
+        upper_bound: int,
+        cache: CompletionCache = None,
+        deadline: float = np.inf,
+        max_nodes: float = np.inf,
+        on_improvement: Callable[[List[List[int]]], None] = None,
+) -> Tuple[List[List[int]], bool]:
+    """
+    Korf's bin-completion, as a depth-first search: each level of the search tree fills one bin,
+    with the largest remaining item and one of its undominated completions, trying the completions with a larger sum first.
+    The current packing is a stack of bins, so going back up the tree only pops a bin.
+    The remaining items are represented by the counts of the distinct sizes, so removing a completion only decrements counts.
+    A branch is pruned when its bins, plus the L1 lower bound of its remaining items, are not fewer than in the best packing found so far.
+
+    Nogood pruning (Korf, 2003): after the subtree of a completion A of x was searched, the search continues with a completion B,
+    whose sum is not larger. If a bin below B, with a largest item y and a completion C, contains all the items of A that are not in B,
+    then these items can be swapped with the items of B that are not in A, and the result fits in y's bin.
+    This gives a packing with the same number of bins, in which x is packed with A; such packings were already searched,
+    so this bin is skipped. A nogood is passed down the tree as long as the remaining items still contain it.
+
+    :param sorted_items: the items, in descending order.
+    :param lb: a lower bound on the number of bins; the search stops when it finds a packing with this number of bins.
+    :param upper_bound: the number of bins in a known packing (e.g. by BFD).
+    :param cache: a cache of completions; by default, a new cache is used for this search.
+    :param deadline: a time, by time.perf_counter(), at which the search stops.
+    :param max_nodes: the search stops after trying this number of bins.
+    :param on_improvement: called with each packing that is better than the best one found so far.
+    :return: the best packing found, with fewer than upper_bound bins (or None if none was found),
+        and whether the search was completed, which proves that this packing has the minimum number of bins.
+
+    >>> depth_first_search(100, [82, 43, 40, 15, 12, 6], lb=2, upper_bound=3)
+    ([[82, 12, 6], [43, 40, 15]], True)
+    >>> depth_first_search(100, [82, 43, 40, 15, 12, 6], lb=2, upper_bound=2)
+    (None, True)
+    >>> depth_first_search(10, [6, 6, 6, 4, 4, 4, 3, 3, 3, 1], lb=4, upper_bound=5)
+    ([[6, 4], [6, 4], [6, 4], [3, 3, 3, 1]], True)
+    >>> depth_first_search(10, [6, 6, 6, 4, 4, 4, 3, 3, 3, 1], lb=4, upper_bound=5, max_nodes=3)
+    (None, False)
+    """
+    if cache is None:
+        cache = CompletionCache()
+    sizes, counts = multiset(sorted_items)
+    if not sorted_items:
+        return None, True
+    try:
+        root = SearchNode(binsize, sizes, counts, sum(sorted_items), cache, [], deadline)
+    except TimeoutError:
+        logging.info("The search stopped while generating the completions of the first bin.")
+        return None, False
+    return _search(binsize, sizes, root, [], lb, upper_bound, cache, deadline, max_nodes, on_improvement)
+
+
+def _next_child(node: SearchNode, depth: int, upper_bound: int, binsize: int, index_of: Dict[int, int]) -> Tuple[List[int], List[int], int, List[Counter]]:
+    """
+    Advance the given node, at the given depth, to its next completion that is not pruned.
+    index_of maps each distinct size to its index in the counts.
+    Returns the bin of x with this completion, the counts of the remaining items, their sum, and the nogoods for the child node;
+    or None if there are no more completions to try.
+    """
+    while node.next_completion < len(node.completions):
+        completion = node.completions[node.next_completion]
+        node.next_completion += 1
+        remaining_sum = node.items_sum - sum(completion)
+
+        # The completions are sorted by descending sum, so if this one is pruned, so are the next ones.
+        if depth + 1 + lower_bound(binsize, [remaining_sum]) >= upper_bound:
+            logging.debug(f"Branch pruned at depth {depth}: cannot improve on {upper_bound} bins.")
+            node.next_completion = len(node.completions)
+            return None
+
+        bin_items = [node.x] + completion
+        bin_counts = Counter(bin_items)
+        if any(all(bin_counts[size] >= count for size, count in nogood.items()) for nogood in node.nogoods):
+            logging.debug(f"Branch pruned at depth {depth}: the bin {bin_items} contains a nogood.")
+            continue
+
+        completion_counts = Counter(completion)
+        new_nogoods = [explored - completion_counts for explored in node.explored]
+        node.explored.append(completion_counts)
+        remaining = list(node.counts)
+        for item in completion:
+            remaining[index_of[item]] -= 1
+        nogoods = [nogood for nogood in node.nogoods if all(remaining[index_of[size]] >= count for size, count in nogood.items())]
+        nogoods.extend(nogood for nogood in new_nogoods if nogood)
+        return bin_items, remaining, remaining_sum, nogoods
+    return None
+
+
+def _search(
+        binsize: int,
+        sizes: List[int],
+        root: SearchNode,
+        prefix: List[List[int]],
+        lb: int,
+        upper_bound: int,
+        cache: CompletionCache,
+        deadline: float,
+        max_nodes: float,
+        on_improvement: Callable[[List[List[int]]], None],
+        shared: "SharedBound" = None,
+) -> Tuple[List[List[int]], bool]:
+    """
+    The depth-first search of the subtree of the given root node, below the bins in prefix. See depth_first_search.
+    If shared is given, the best number of bins and the number of nodes are shared with the searches of other subtrees.
+    """
+    index_of = {size: i for i, size in enumerate(sizes)}
+    best_packing = None
+    packing = list(prefix)  # the bins on the path from the root of the whole tree to the current node.
+    stack = [root]
+    num_nodes = 0
+    while stack:
+        if shared is not None:
+            upper_bound = min(upper_bound, shared.upper_bound)
+            num_nodes = shared.num_nodes
+        if upper_bound <= lb:  # another search found an optimal packing.
+            return best_packing, True
+        if num_nodes >= max_nodes or time.perf_counter() >= deadline:
+            logging.info(f"The search stopped after {num_nodes} nodes, with {upper_bound} bins.")
+            return best_packing, False
+        node = stack[-1]
+        if len(packing) == len(prefix) + len(stack):  # undo the last completion tried at this node.
+            packing.pop()
+        child = _next_child(node, len(packing), upper_bound, binsize, index_of)
+        if child is None:
+            stack.pop()
+            continue
+
+        num_nodes += 1
+        if shared is not None:
+            shared.add_node()
+        bin_items, remaining, remaining_sum, nogoods = child
+        packing.append(bin_items)
+        if any(remaining):
+            try:
+                stack.append(SearchNode(binsize, sizes, remaining, remaining_sum, cache, nogoods, deadline))
+            except TimeoutError:
+                logging.info(f"The search stopped after {num_nodes} nodes, with {upper_bound} bins.")
+                return best_packing, False
+        else:
+            logging.info(f"Updated best solution from {upper_bound} bins to {len(packing)} bins.")
+            best_packing = [list(bin_items) for bin_items in packing]
+            upper_bound = len(packing)
+            if shared is not None:
+                shared.improve(upper_bound)
+            if on_improvement is not None:
+                on_improvement(best_packing)
+            if upper_bound == lb:
+                logging.info(f"found and optimal solution with {lb} bins.")
+                break
+    return best_packing, True
 
-        # If we found a solution with number of bins that equals the lower bound - it's optimal! Hurray!
-        if best_solution_so_far.num == lb:
-            logging.info(f"found and optimal solution with {lb} bins.")
-            break
 
-    return best_solution_so_far
+class SharedBound:
+    """
+    The number of bins in the best packing found by any worker process, and the number of nodes searched by all of them,
+    kept in shared memory, so that each worker prunes with the global bound.
+    """
 
+    def __init__(self, upper_bound: int):
+        self._lock = multiprocessing.Lock()
+        self._values = multiprocessing.RawArray("q", [upper_bound, 0])
+
+    @property
+    def upper_bound(self) -> int:
+        return self._values[0]
+
+    @property
+    def num_nodes(self) -> int:
+        return self._values[1]
+
+    def improve(self, num_bins: int):
+        with self._lock:
+            if num_bins < self._values[0]:
+                self._values[0] = num_bins
+
+    def add_node(self):
+        with self._lock:
+            self._values[1] += 1
+
+
+# Each task of parallel_search should be much smaller than the whole search, so that a worker that finishes early
+# takes a remaining subtree, instead of waiting for the largest task.
+TASKS_PER_PROCESS = 8
+
+# parallel_search first searches this number of nodes (about half a second) in the calling process.
+# Most trees are smaller, and starting a pool of processes for them costs more than the whole search.
+SEQUENTIAL_NODES = 5000
+
+
+def parallel_search(
+        binsize: int,
+        sorted_items: List[int],
+        lb: int,
+        upper_bound: int,
+        processes: int = None,
+        cache: CompletionCache = None,
+        deadline: float = np.inf,
+        max_nodes: float = np.inf,
+        on_improvement: Callable[[List[List[int]]], None] = None,
+        sequential_nodes: int = SEQUENTIAL_NODES,
+) -> Tuple[List[List[int]], bool]:
+    """
+    The same search as depth_first_search, by a pool of worker processes.
+    It starts as depth_first_search, in this process, with a budget of sequential_nodes nodes;
+    only a search tree that is larger than that is searched again, with the bound found so far, by the pool.
+    The first levels of the search tree are expanded, breadth-first, until there are about TASKS_PER_PROCESS subtrees per process;
+    the subtrees are handed to the workers in the order of the sequential search, each to the next idle worker.
+    A subtree is not split once a worker has started it, so the load is balanced only as finely as this initial split,
+    and the speedup over depth_first_search depends on the instance.
+    The workers share the number of bins in the best packing found so far, and prune with it.
+    Improvements are reported to on_improvement when the subtree in which they were found is finished.
+    The number of bins is the same as in depth_first_search, but when there are several optimal packings, it may return another one.
+
+    :param processes: the number of worker processes; by default, one per CPU.
+    :param sequential_nodes: the number of nodes searched in this process before the pool is started.
+
+    >>> packing, is_complete = parallel_search(10, [6, 6, 6, 4, 4, 4, 3, 3, 3, 1], lb=4, upper_bound=5, processes=2)
+    >>> len(packing), is_complete
+    (4, True)
+    >>> items = [694, 693, 668, 662, 659, 657, 657, 651, 642, 620, 619, 584, 556, 545, 512, 482, 471, 415, 409, 381,
+    ...          377, 368, 356, 346, 324, 321, 320, 279, 259, 245, 236, 235, 229, 212, 206, 176, 170, 155, 131, 120]
+    >>> packing, is_complete = parallel_search(1000, items, lb=17, upper_bound=18, processes=2, sequential_nodes=0)
+    >>> len(packing), is_complete, sorted(sum(packing, []), reverse=True) == items
+    (17, True, True)
+    >>> parallel_search(100, [82, 43, 40, 15, 12, 6], lb=2, upper_bound=2, processes=2, sequential_nodes=0)
+    (None, True)
+    """
+    processes = processes or os.cpu_count()
+    if cache is None:
+        cache = CompletionCache()
+    if not sorted_items:
+        return None, True
+
+    # Search small trees in this process.
+    best_packing = None
+    if sequential_nodes > 0:
+        best_packing, is_complete = depth_first_search(
+            binsize, sorted_items, lb, upper_bound, cache, deadline, min(max_nodes, sequential_nodes), on_improvement
+        )
+        if best_packing is not None:
+            upper_bound = len(best_packing)
+        if is_complete or max_nodes <= sequential_nodes or time.perf_counter() >= deadline:
+            return best_packing, is_complete
+        max_nodes -= sequential_nodes
+        logging.info(f"The search tree has more than {sequential_nodes} nodes; it is searched again by {processes} processes.")
+
+    sizes, counts = multiset(sorted_items)
+    index_of = {size: i for i, size in enumerate(sizes)}
+
+    # Expand the first levels. A task is a node, with the bins above it.
+    try:
+        tasks = [([], SearchNode(binsize, sizes, counts, sum(sorted_items), cache, [], deadline))]
+        while 0 < len(tasks) < TASKS_PER_PROCESS * processes and upper_bound > lb:
+            next_tasks = []
+            for prefix, node in tasks:
+                while (child := _next_child(node, len(prefix), upper_bound, binsize, index_of)) is not None:
+                    bin_items, remaining, remaining_sum, nogoods = child
+                    if any(remaining):
+                        next_tasks.append((prefix + [bin_items], SearchNode(binsize, sizes, remaining, remaining_sum, cache, nogoods, deadline)))
+                    else:
+                        best_packing = prefix + [bin_items]
+                        upper_bound = len(best_packing)
+                        if on_improvement is not None:
+                            on_improvement(best_packing)
+            tasks = next_tasks
+    except TimeoutError:
+        logging.info("The search stopped while expanding the first levels.")
+        return best_packing, False
+    # Tasks that were created before a better packing was found may have no chance to improve it.
+    tasks = [(prefix, node) for prefix, node in tasks if len(prefix) + lower_bound(binsize, [node.items_sum + node.x]) < upper_bound]
+    if not tasks or upper_bound <= lb:
+        return best_packing, True
+    logging.info(f"Searching {len(tasks)} subtrees with {processes} processes.")
+
+    shared = SharedBound(upper_bound)
+    is_complete = True
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(shared,)) as pool:
+        arguments = [(binsize, sizes, node, prefix, lb, deadline, max_nodes) for prefix, node in tasks]
+        for packing, is_task_complete in pool.imap_unordered(_search_task, arguments):
+            is_complete = is_complete and is_task_complete
+            if packing is not None and (best_packing is None or len(packing) < len(best_packing)):
+                best_packing = packing
+                if on_improvement is not None:
+                    on_improvement(best_packing)
+    # Once a worker finds a packing with lb bins, the remaining tasks return immediately;
+    # the pool is not terminated before that, so that the result of this worker is not lost.
+    return best_packing, is_complete
+
+
+_worker_shared = None
+_worker_cache = None
+
+
+def _init_worker(shared: SharedBound):
+    global _worker_shared, _worker_cache
+    _worker_shared = shared
+    _worker_cache = CompletionCache()  # each worker keeps its cache for all its tasks.
+
+
+def _search_task(arguments: tuple):
+    """
+    The task of a worker of parallel_search: search the subtree of the given node, with the shared bound.
+    """
+    binsize, sizes, node, prefix, lb, deadline, max_nodes = arguments
+    return _search(binsize, sizes, node, prefix, lb, _worker_shared.upper_bound, _worker_cache, deadline, max_nodes, None, _worker_shared)
 
 if __name__ == "__main__":
     import doctest
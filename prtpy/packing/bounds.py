@@ -0,0 +1,192 @@
+"""
+    Lower bounds on the number of bins in bin-packing, by Martello and Toth (1990):
+        "Lower bounds and reduction procedures for the bin packing problem",
+        Discrete Applied Mathematics 28(1), 59-70.
+
+    The bounds are computed over the sorted item sizes, with prefix sums and binary search (numpy.searchsorted).
+"""
+
+from typing import List, Tuple
+import numpy as np
+
+
+def l1(binsize: float, items: List[float]) -> int:
+    """
+    The continuous lower bound: the sum of the items divided by the bin size, rounded up.
+
+    >>> l1(100, [99, 94, 79, 64, 50, 44, 43, 37, 32, 19, 18, 7, 3])
+    6
+    >>> l1(10, [])
+    0
+    """
+    sizes = _sorted_sizes(binsize, items)
+    if len(sizes) == 0:
+        return 0
+    return int(_ceil_div(sizes.sum(keepdims=True), binsize)[0])
+
+
+def l2(binsize: float, items: List[float]) -> int:
+    """
+    The L2 lower bound. For every threshold a <= binsize/2, the items larger than binsize-a need a bin each;
+    so do the items larger than binsize/2, whose bins have a free space that the items in [a, binsize/2] may fill;
+    the items in [a, binsize/2] that do not fit into this free space need additional bins.
+    The maximum over all thresholds is computed in O(n log n) time.
+
+    >>> l2(100, [99, 94, 79, 64, 50, 44, 43, 37, 32, 19, 18, 7, 3])
+    6
+    >>> l2(10, [6, 6, 6, 4, 4, 4])
+    3
+    >>> l2(10, [6, 6, 6, 1, 1, 1]), l1(10, [6, 6, 6, 1, 1, 1])
+    (3, 3)
+    >>> l2(10, [3, 3, 3, 3])
+    2
+    """
+    return _l2_of_sorted(binsize, _sorted_sizes(binsize, items))
+
+
+def l3(binsize: float, items: List[float]) -> int:
+    """
+    The L3 lower bound. The reduction procedure puts the largest item into a bin of its own when no two other items fit with it,
+    together with the largest other item that fits with it (if any); by a dominance argument, some optimal packing has this bin.
+    After each reduction, the bound is the number of bins fixed so far, plus the L2 bound of the remaining items;
+    then the smallest remaining item is removed, which relaxes the instance, and the reduction continues from where it stopped.
+    The maximum over all these bounds is returned.
+
+    The items are never moved: the removed ones are skipped by two union-find structures over the sorted array,
+    so the reductions take O(n log n) time in total. L2 of the remaining items is recomputed, in O(n) vectorised steps,
+    only when a cheap upper bound on it (the large items, plus the small items by volume) can improve the maximum;
+    so the worst case is O(n^2), and typical instances are much faster.
+
+    >>> l3(100, [99, 94, 79, 64, 50, 44, 43, 37, 32, 19, 18, 7, 3])
+    6
+    >>> l3(10, [4, 4, 3, 10, 6, 4, 5, 6, 1, 7])
+    5
+    >>> l3(10, [10, 9, 6, 6, 3, 3, 2]), l2(10, [10, 9, 6, 6, 3, 3, 2])
+    (5, 4)
+    >>> l3(10, [])
+    0
+
+    Float items whose sum is the bin size fit together, however their sum is rounded:
+    >>> l3(20/7, [x/7 for x in [1, 19, 19, 9, 11]])
+    3
+    """
+    sizes = _sorted_sizes(binsize, items)
+    best = _l2_of_sorted(binsize, sizes)
+    n = len(sizes)
+    values = sizes.tolist()
+    limit = _fit_limit(binsize, sizes)
+    is_large = sizes > limit / 2
+    alive = np.ones(n, dtype=bool)
+    # left[i+1] leads to the largest remaining index <= i (or -1), and right[i] to the smallest remaining index >= i (or n).
+    left = list(range(n + 1))
+    right = list(range(n + 1))
+    num_remaining, num_fixed = n, 0
+    num_large, small_sum = int(is_large.sum()), sizes[~is_large].sum()
+
+    def remove(index: int):
+        nonlocal num_remaining, num_large, small_sum
+        alive[index] = False
+        left[index + 1] = index
+        right[index] = index + 1
+        num_remaining -= 1
+        if is_large[index]:
+            num_large -= 1
+        else:
+            small_sum -= values[index]
+
+    while num_remaining > 0:
+        # The reduction.
+        while num_remaining > 0:
+            largest = _find(left, n) - 1
+            smallest = _find(right, 0)
+            if num_remaining >= 3 and values[largest] + values[smallest] + values[_find(right, smallest + 1)] <= limit:
+                break
+            remove(largest)
+            num_fixed += 1
+            fitting = int(np.searchsorted(sizes, limit - values[largest], side="right"))
+            partner = _find(left, fitting) - 1  # the largest other item that fits.
+            if partner >= 0:
+                remove(partner)
+        if num_fixed + num_large + int(_ceil_div(np.array([small_sum]), binsize)[0]) > best:
+            best = max(best, num_fixed + _l2_of_sorted(binsize, sizes[alive]))
+        if num_remaining > 0:
+            remove(_find(right, 0))
+    return best
+
+
+def certificate(binsize: float, items: List[float], num_of_bins: int) -> Tuple[int, bool]:
+    """
+    Returns the L3 lower bound, and whether a packing with the given number of bins is optimal, i.e., attains the bound.
+    A packing with fewer bins than the bound would contradict its validity, so it raises an AssertionError.
+
+    >>> certificate(100, [99, 94, 79, 64, 50, 44, 43, 37, 32, 19, 18, 7, 3], 6)
+    (6, True)
+    >>> certificate(10, [6, 6, 6, 4, 4, 4], 4)
+    (3, False)
+    >>> certificate(20/7, [x/7 for x in [1, 19, 19, 9, 11]], 3)
+    (3, True)
+    """
+    bound = l3(binsize, items)
+    assert bound <= num_of_bins, f"The lower bound {bound} is larger than the number of bins {num_of_bins} of a packing."
+    return bound, num_of_bins == bound
+
+
+def _sorted_sizes(binsize: float, items: List[float]) -> np.ndarray:
+    sizes = np.sort(np.asarray(items))
+    if len(sizes) > 0 and sizes[-1] > binsize:
+        raise ValueError(f"Item of size {sizes[-1]} is larger than the bin size {binsize}.")
+    return sizes
+
+
+def _fit_limit(binsize: float, sizes: np.ndarray) -> float:
+    """
+    The bounds consider items to fit together when their sum is at most this limit.
+    For floats, it is slightly above binsize: their sums and differences are rounded differently from the sums computed
+    by the packing algorithms, and the small tolerance keeps the bounds valid. Like in _ceil_div, integers are compared exactly.
+    """
+    if np.issubdtype(sizes.dtype, np.integer) and float(binsize).is_integer():
+        return binsize
+    return binsize + 1e-9 * abs(binsize)
+
+
+def _ceil_div(numerators: np.ndarray, binsize: float) -> np.ndarray:
+    if np.issubdtype(numerators.dtype, np.integer) and float(binsize).is_integer():
+        return -(-numerators // int(binsize))
+    # A small tolerance, so that sums of floats that are slightly above a multiple of binsize are not rounded up.
+    return np.ceil(numerators / binsize - 1e-9).astype(int)
+
+
+def _l2_of_sorted(binsize: float, sizes: np.ndarray) -> int:
+    """
+    The L2 bound of the given sizes, in ascending order.
+    """
+    if len(sizes) == 0:
+        return 0
+    limit = _fit_limit(binsize, sizes)
+    prefix_sums = np.concatenate(([0], np.cumsum(sizes)))
+    thresholds = np.unique(np.concatenate(([0], sizes[sizes <= limit / 2])))
+    num_up_to_half = np.searchsorted(sizes, limit / 2, side="right")
+    num_up_to_complement = np.searchsorted(sizes, limit - thresholds, side="right")  # the items in the bins of J1 are larger.
+    num_below_threshold = np.searchsorted(sizes, thresholds, side="left")
+    num_large = len(sizes) - num_up_to_half  # the items in J1 and J2, each in its own bin.
+    num_medium = num_up_to_complement - num_up_to_half  # the items in J2.
+    free_space = num_medium * binsize - (prefix_sums[num_up_to_complement] - prefix_sums[num_up_to_half])
+    small_sum = prefix_sums[num_up_to_half] - prefix_sums[num_below_threshold]  # the items in J3.
+    additional_bins = np.maximum(0, _ceil_div(small_sum - free_space, binsize))
+    return int((num_large + additional_bins).max())
+
+
+def _find(parent: List[int], index: int) -> int:
+    """
+    The root of the given index in a union-find forest, with path halving.
+    """
+    while parent[index] != index:
+        parent[index] = parent[parent[index]]
+        index = parent[index]
+    return index
+
+if __name__ == "__main__":
+    import doctest
+
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
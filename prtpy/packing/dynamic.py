@@ -0,0 +1,163 @@
+"""
+    Dynamic bin-packing: items arrive and depart over time, and the packing is updated incrementally
+    instead of being recomputed from scratch. See e.g. Coffman, Garey and Johnson (1983):
+        "Dynamic bin packing", SIAM Journal on Computing 12(2), 227-258.
+
+    New items are packed by first-fit, using a segment-tree over the bin sums, so inserting and removing an item take O(log B) time
+    (plus the size of its bin, for removing it from the bin contents).
+    Optionally, under-filled bins can be emptied by migrating their items to other bins, with a bound on the number of migrations.
+"""
+
+from typing import Callable, List, Any, Dict
+import logging
+
+import numpy as np
+
+from prtpy.bins import BinsKeepingContents
+from prtpy.packing.first_fit import SumTree
+
+logger = logging.getLogger(__name__)
+
+
+class DynamicPacker:
+    """
+    A bin-packing that supports inserting and removing items. The items should be hashable and distinct.
+    The packing is kept in `bins`, a BinsKeepingContents structure; bins emptied in the middle stay open, and are reused first.
+
+    >>> packer = DynamicPacker(binsize=10)
+    >>> for item in [6, 5, 4, 3, 2]:
+    ...     _ = packer.insert(item)
+    >>> packer.bins.bins
+    [[6, 4], [5, 3, 2]]
+    >>> packer.remove(4)
+    >>> packer.insert(1)
+    0
+    >>> packer.bins.bins
+    [[6, 1], [5, 3, 2]]
+
+    Items with names:
+    >>> packer = DynamicPacker(binsize=60, valueof={"a":44, "b":24, "c":24, "d":22}.__getitem__)
+    >>> [packer.insert(item) for item in "abcd"]
+    [0, 1, 1, 2]
+    >>> packer.remove("b"); packer.remove("c")
+    >>> packer.bins.bins, packer.bins.num
+    ([['a'], [], ['d']], 3)
+    """
+
+    def __init__(self, binsize: float, valueof: Callable[[Any], float] = lambda x: x):
+        self.binsize = binsize
+        self.valueof = valueof
+        self.bins = BinsKeepingContents().set_valueof(valueof)
+        self.tree = SumTree()
+        self.bin_of: Dict[Any, int] = {}  # maps each item to the index of its bin.
+
+    def insert(self, item: Any) -> int:
+        """
+        Add the given item to the first bin that fits it, opening a new bin if needed. Returns the index of the bin.
+        """
+        if item in self.bin_of:
+            raise ValueError(f"Item {item} is already packed, in bin {self.bin_of[item]}.")
+        value = self.valueof(item)
+        if value > self.binsize:
+            raise ValueError(f"Item {item} has size {value} which is larger than the bin size {self.binsize}.")
+        ibin = self.tree.first_fit(value, self.binsize)
+        if ibin is None:  # if the item does not fit into any bin
+            self.bins.add_empty_bins(1)
+            ibin = self.bins.num - 1
+            self.tree.append(self.bins.sums[ibin])
+        self._add(item, ibin)
+        return ibin
+
+    def remove(self, item: Any):
+        """
+        Remove the given item from its bin. Empty bins at the end are closed.
+        """
+        if item not in self.bin_of:
+            raise ValueError(f"Item {item} is not packed.")
+        self._remove(item)
+        while self.bins.num > 0 and not self.bins.bins[-1]:
+            self.bins.remove_bins(1)
+            self.tree.pop()
+
+    def consolidate(self, max_migrations: int = None, threshold: float = 0.5) -> int:
+        """
+        Try to empty the under-filled bins, whose sum is positive and less than threshold*binsize, starting from the emptiest.
+        All the items of such a bin are moved by first-fit to the other bins, or none of them is, if they do not all fit.
+        At most max_migrations items are moved (no bound if it is None). Returns the number of items moved.
+
+        >>> packer = DynamicPacker(binsize=10)
+        >>> for item in [5, 6, 4, 3, 2, 1]:
+        ...     _ = packer.insert(item)
+        >>> packer.remove(5); packer.remove(6)
+        >>> packer.bins.bins
+        [[4, 1], [3], [2]]
+        >>> packer.consolidate(max_migrations=1)
+        1
+        >>> packer.bins.bins
+        [[4, 1, 2], [3]]
+        >>> packer.consolidate()
+        1
+        >>> packer.bins.bins
+        [[4, 1, 2, 3]]
+        """
+        sums = self.bins.sums
+        under_filled = [ibin for ibin in range(self.bins.num) if 0 < sums[ibin] < threshold * self.binsize]
+        migrations = 0
+        # Moving items into an empty bin does not save a bin. So the empty bins, and the bins emptied here,
+        # do not receive items until the end; this also ensures that no item is moved twice.
+        emptied = [ibin for ibin in range(self.bins.num) if not self.bins.bins[ibin]]
+        for ibin in emptied:
+            self.tree.update(ibin, np.inf)
+        for source in sorted(under_filled, key=lambda ibin: sums[ibin]):
+            if not 0 < sums[source] < threshold * self.binsize:  # it received items from an emptier bin.
+                continue
+            items = sorted(self.bins.bins[source], key=self.valueof, reverse=True)
+            if max_migrations is not None and migrations + len(items) > max_migrations:
+                continue
+            # Plan the moves on the tree only, so that nothing has to be undone in the bins if some item does not fit.
+            self.tree.update(source, np.inf)
+            planned_sums = {}
+            targets = []
+            for item in items:
+                value = self.valueof(item)
+                target = self.tree.first_fit(value, self.binsize)
+                if target is None:
+                    break
+                planned_sums[target] = planned_sums.get(target, sums[target]) + value
+                self.tree.update(target, planned_sums[target])
+                targets.append(target)
+            for target in planned_sums:
+                self.tree.update(target, sums[target])
+            if len(targets) < len(items):
+                self.tree.update(source, sums[source])
+                continue
+            for item, target in zip(items, targets):
+                self._remove(item)
+                self._add(item, target)
+            self.tree.update(source, np.inf)
+            emptied.append(source)
+            migrations += len(items)
+            logger.info("Moved the %d items of bin %d to other bins", len(items), source)
+        for source in emptied:
+            self.tree.update(source, sums[source])
+        while self.bins.num > 0 and not self.bins.bins[-1]:
+            self.bins.remove_bins(1)
+            self.tree.pop()
+        return migrations
+
+    def _add(self, item: Any, ibin: int):
+        self.bins.add_item_to_bin(item, ibin)
+        self.tree.update(ibin, self.bins.sums[ibin])
+        self.bin_of[item] = ibin
+
+    def _remove(self, item: Any):
+        ibin = self.bin_of.pop(item)
+        self.bins.remove_item_from_bin(item, ibin)
+        self.tree.update(ibin, self.bins.sums[ibin])
+
+
+if __name__ == "__main__":
+    import doctest
+
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
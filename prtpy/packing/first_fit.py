@@ -5,6 +5,7 @@
 """
 
 from typing import Callable, List, Any
+import numpy as np
 from prtpy import outputtypes as out, Bins
 
 
@@ -21,20 +22,32 @@ def online(bins: Bins, binsize: float, items: List[any], valueof: Callable[[Any]
     >>> list(online(BinsKeepingContents(), binsize=9, items=[1,2,3,3,5,9,9]).sums)
     [9.0, 5.0, 9.0, 9.0]
     """
-    bins.add_empty_bins(1) 
-    for item in items:
-        value = valueof(item)
+    bins.add_empty_bins(1)
+    tree = SumTree(bins.sums[:bins.num])
+    items = list(items)
+    values = [valueof(item) for item in items]
+    start = 0
+    while start < len(items):
+        value = values[start]
         if value>binsize:
-            raise ValueError(f"Item {item} has size {value} which is larger than the bin size {binsize}.")
-        ibin = 0
-        while ibin  < bins.num:
-            if bins.sums[ibin] + value <= binsize:
-                bins.add_item_to_bin(item, ibin)
-                break
-            ibin += 1
-        else:  # if not added to any bin
-            bins.add_empty_bins(1)
-            bins.add_item_to_bin(item, ibin)
+            raise ValueError(f"Item {items[start]} has size {value} which is larger than the bin size {binsize}.")
+        # A run of items with the same value fills the first bin that fits them with as many copies as fit, then the next one.
+        end = start + 1
+        while end < len(items) and values[end] == value:
+            end += 1
+        while start < end:
+            ibin = tree.first_fit(value, binsize)
+            if ibin is None:  # if the item does not fit into any bin
+                bins.add_empty_bins(1)
+                ibin = bins.num - 1
+                tree.append(bins.sums[ibin])
+            count = copies_that_fit(bins.sums[ibin], value, binsize, end - start)
+            if count == 1:
+                bins.add_item_to_bin(items[start], ibin)
+            else:
+                bins.add_items_to_bin(items[start : start + count], ibin, total=count * value)
+            tree.update(ibin, bins.sums[ibin])
+            start += count
     return bins
 
 
@@ -63,6 +76,10 @@ def decreasing(bins: Bins, binsize: float, items: List[any], valueof: Callable[[
     >>> decreasing(BinsKeepingContents(), binsize=76, items=example2).bins # 5 bins
     [[51, 25], [27.5, 27.5, 12], [27.5, 27.5, 12], [10, 10, 10, 10, 10, 10, 10], [10, 10]]
 
+    The copies of each size are packed a bin at a time, so many items with few distinct sizes are fast:
+    >>> decreasing(BinsKeepingSums(), binsize=1000, items=[248]*10**4 + [501]*10**4 + [252]*10**4).num
+    12500
+
     >>> from prtpy import pack
     >>> pack(algorithm=decreasing, binsize=60, items={"a":44, "b":24, "c":24, "d":22, "e":21, "f":17, "g":8, "h":8, "i":6, "j":6})
     [['a', 'g', 'h'], ['b', 'c', 'i', 'j'], ['d', 'e', 'f']]
@@ -73,6 +90,102 @@ def decreasing(bins: Bins, binsize: float, items: List[any], valueof: Callable[[
     return online(bins, binsize, items, valueof)
 
 
+def copies_that_fit(bin_sum: float, value: float, binsize: float, count: int) -> int:
+    """
+    The number of copies, out of `count`, of an item with the given value that can be added one by one to a bin with the given sum,
+    assuming that the first one fits. Integer sums are exact in floating point, so for integers this is a division;
+    otherwise it returns 1, and the copies are added one at a time.
+
+    >>> copies_that_fit(3, 2, binsize=10, count=100), copies_that_fit(3, 2, binsize=10, count=2), copies_that_fit(0.5, 0.5, binsize=10, count=5)
+    (3, 2, 1)
+    """
+    if count == 1 or not all(_is_exact_integer(number) for number in (bin_sum, value, binsize)):
+        return 1
+    if value <= 0:
+        return count if value == 0 else 1
+    return min(count, int((binsize - bin_sum) // value))
+
+
+def _is_exact_integer(number: float) -> bool:
+    return float(number).is_integer() and abs(number) < 2**53
+
+
+class SumTree:
+    """
+    A min segment-tree over the bin sums, for finding the first bin that fits an item in O(log B) time.
+    Leaf i holds the sum of bin i; the leaves after the last bin hold +inf.
+    Each internal node holds the minimum of its children, so a subtree contains a bin that fits
+    the item if and only if its minimum sum fits. The tree is stored in a NumPy array whose capacity doubles when it is full.
+
+    >>> tree = SumTree([5, 2, 7])
+    >>> tree.first_fit(3, binsize=9), tree.first_fit(6, binsize=9), tree.first_fit(8, binsize=9)
+    (0, 1, None)
+    >>> tree.update(0, 8)
+    >>> tree.append(0)
+    >>> tree.first_fit(3, binsize=9), tree.first_fit(8, binsize=9)
+    (1, 3)
+    """
+
+    def __init__(self, sums: List[float] = ()):
+        sums = np.asarray(sums, dtype=float)
+        self.size = len(sums)
+        self.capacity = 1
+        while self.capacity < self.size:
+            self.capacity *= 2
+        self.nodes = np.full(2 * self.capacity, np.inf)
+        self.nodes[self.capacity : self.capacity + self.size] = sums
+        self._rebuild()
+
+    def _rebuild(self):
+        level = self.capacity
+        while level > 1:
+            children = self.nodes[level : 2 * level]
+            self.nodes[level // 2 : level] = np.minimum(children[0::2], children[1::2])
+            level //= 2
+
+    def append(self, bin_sum: float):
+        if self.size == self.capacity:
+            leaves = self.nodes[self.capacity :]
+            self.capacity *= 2
+            self.nodes = np.full(2 * self.capacity, np.inf)
+            self.nodes[self.capacity : self.capacity + self.size] = leaves
+            self._rebuild()
+        self.size += 1
+        self.update(self.size - 1, bin_sum)
+
+    def pop(self):
+        """
+        Remove the last bin.
+        """
+        self.size -= 1
+        self.update(self.size, np.inf)
+
+    def update(self, ibin: int, bin_sum: float):
+        nodes = self.nodes
+        node = self.capacity + ibin
+        nodes[node] = bin_sum
+        while node > 1:
+            node //= 2
+            new_min = min(nodes[2 * node], nodes[2 * node + 1])
+            if nodes[node] == new_min:
+                break
+            nodes[node] = new_min
+
+    def first_fit(self, value: float, binsize: float) -> int:
+        """
+        The index of the first bin whose sum plus the given value is at most binsize, or None if there is no such bin.
+        """
+        nodes = self.nodes
+        if not nodes[1] + value <= binsize:
+            return None
+        node = 1
+        while node < self.capacity:
+            node *= 2
+            if not nodes[node] + value <= binsize:
+                node += 1
+        return node - self.capacity
+
+
 if __name__ == "__main__":
     import doctest
 
@@ -0,0 +1,72 @@
+"""
+    Pack the numbers using the Harmonic-k bin-packing algorithm of Lee and Lee (1985):
+        "A simple on-line bin-packing algorithm", Journal of the ACM 32(3), 562-572.
+
+    The items are split into k classes by size: class j < k contains the items larger than binsize/(j+1) and at most binsize/j,
+    and class k contains the items of size at most binsize/k. There is one open bin per class, filled by next-fit;
+    so a bin of class j < k holds exactly j items. Each item is handled in constant time.
+"""
+
+from typing import Callable, List, Any
+from prtpy import outputtypes as out, Bins
+
+
+def online(bins: Bins, binsize: float, items: List[any], valueof: Callable[[Any], float] = lambda x: x, k: int = 7):
+    """
+    Pack the given items into bins using the online *Harmonic-k* algorithm.
+
+    :param k: the number of size classes.
+
+    >>> from prtpy.bins import BinsKeepingContents, BinsKeepingSums
+    >>> online(BinsKeepingContents(), binsize=12, items=[7,5,3,6,2,4,1,1]).bins
+    [[7], [5, 6], [3], [2], [4], [1, 1]]
+    >>> online(BinsKeepingContents(), binsize=12, items=[7,5,3,6,2,4,1,1], k=2).bins
+    [[7], [5, 3], [6, 2, 4], [1, 1]]
+
+    >>> from prtpy import pack
+    >>> pack(algorithm=online, binsize=60, items=[44, 24, 24, 22, 21, 17, 8, 8, 6, 6], k=3)
+    [[44], [24, 24], [22, 21], [17, 8, 8, 6, 6]]
+
+    The item 0.1 is in class 10, since 0.1 <= 1/10, although 1 // 0.1 == 9:
+    >>> online(BinsKeepingContents(), binsize=1, items=[0.11, 0.1, 0.1], k=10).bins
+    [[0.11], [0.1, 0.1]]
+    """
+    if k < 1:
+        raise ValueError(f"The number of classes k={k} should be at least 1.")
+    open_bins = {}  # maps a size class to the index of its open bin.
+    for item in items:
+        value = valueof(item)
+        if value > binsize:
+            raise ValueError(f"Item {item} has size {value} which is larger than the bin size {binsize}.")
+        size_class = _size_class(value, binsize, k)
+        ibin = open_bins.get(size_class)
+        if ibin is None or not bins.sums[ibin] + value <= binsize:
+            bins.add_empty_bins(1)
+            ibin = open_bins[size_class] = bins.num - 1
+        bins.add_item_to_bin(item, ibin)
+    return bins
+
+
+def _size_class(value: float, binsize: float, k: int) -> int:
+    """
+    The class j of the item: the largest j <= k with value <= binsize/j (k for items of size 0).
+    binsize // value only estimates j, since the division may round; the estimate is corrected by comparing with the thresholds binsize/j.
+
+    >>> _size_class(0.1, 1, 10), _size_class(0.1, 1, 7), _size_class(0.11, 1, 10), _size_class(0.5, 1, 7), _size_class(0.6, 1, 7)
+    (10, 7, 9, 2, 1)
+    """
+    if value <= 0:
+        return k
+    size_class = max(1, min(k, int(binsize // value)))
+    while size_class < k and value <= binsize / (size_class + 1):
+        size_class += 1
+    while size_class > 1 and value > binsize / size_class:
+        size_class -= 1
+    return size_class
+
+
+if __name__ == "__main__":
+    import doctest
+
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
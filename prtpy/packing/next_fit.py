@@ -0,0 +1,56 @@
+"""
+    Pack the numbers using the next-fit bin-packing algorithm:
+       https://en.wikipedia.org/wiki/Next-fit_bin_packing
+
+    Only the last bin is open, so each item is handled in constant time.
+"""
+
+from typing import Callable, List, Any
+from prtpy import outputtypes as out, Bins
+
+
+def online(bins: Bins, binsize: float, items: List[any], valueof: Callable[[Any], float] = lambda x: x):
+    """
+    Pack the given items into bins using the online *Next-Fit* algorithm.
+    Each item is added to the last bin if it fits there; otherwise a new bin is opened, and the last bin is never used again.
+
+    >>> from prtpy.bins import BinsKeepingContents, BinsKeepingSums
+    >>> online(BinsKeepingContents(), binsize=9, items=[1,2,3,3,5,9,9]).bins
+    [[1, 2, 3, 3], [5], [9], [9]]
+    >>> online(BinsKeepingContents(), binsize=9, items=[5,3,2,6,1,4]).bins
+    [[5, 3], [2, 6, 1], [4]]
+
+    >>> from prtpy import pack
+    >>> pack(algorithm=online, binsize=60, items={"a":44, "b":24, "c":24, "d":22, "e":21, "f":17, "g":8, "h":8, "i":6, "j":6})
+    [['a'], ['b', 'c'], ['d', 'e', 'f'], ['g', 'h', 'i', 'j']]
+    >>> pack(algorithm=online, binsize=60, items=[44, 24, 24, 22, 21, 17, 8, 8, 6, 6], outputtype=out.Sums)
+    array([44., 48., 60., 28.])
+    """
+    bins.add_empty_bins(1)
+    for item in items:
+        value = valueof(item)
+        if value > binsize:
+            raise ValueError(f"Item {item} has size {value} which is larger than the bin size {binsize}.")
+        if not bins.sums[bins.num - 1] + value <= binsize:
+            bins.add_empty_bins(1)
+        bins.add_item_to_bin(item, bins.num - 1)
+    return bins
+
+
+def decreasing(bins: Bins, binsize: float, items: List[any], valueof: Callable[[Any], float] = lambda x: x):
+    """
+    Pack the given items into bins using the *Next-Fit-Decreasing* algorithm.
+    It sorts the items by descending value, and then runs next-fit.
+
+    >>> from prtpy.bins import BinsKeepingContents
+    >>> decreasing(BinsKeepingContents(), binsize=9, items=[5,3,2,6,1,4]).bins
+    [[6], [5, 4], [3, 2, 1]]
+    """
+    return online(bins, binsize, sorted(items, key=valueof, reverse=True), valueof)
+
+
+if __name__ == "__main__":
+    import doctest
+
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
@@ -0,0 +1,97 @@
+"""
+    Streaming versions of the online bin-packing algorithms.
+
+    They consume an iterable of items, which may be unbounded (e.g. a stream of events),
+    and yield each bin, as a list of items, as soon as it is closed: once no future item can be added to it.
+    Only the open bins are kept in memory.
+"""
+
+from typing import Callable, Iterable, Iterator, List, Any
+
+
+def next_fit(binsize: float, items: Iterable[Any], valueof: Callable[[Any], float] = lambda x: x) -> Iterator[List[Any]]:
+    """
+    Pack the given items by *Next-Fit*. There is only one open bin; it is yielded when an item does not fit into it.
+
+    >>> import itertools
+    >>> bins = next_fit(binsize=10, items=itertools.cycle([3,4,5]))
+    >>> list(itertools.islice(bins, 4))
+    [[3, 4], [5, 3], [4, 5], [3, 4]]
+    >>> list(next_fit(binsize=9, items=[1,2,3,3,5,9,9]))
+    [[1, 2, 3, 3], [5], [9], [9]]
+    """
+    bin_items, bin_sum = [], 0
+    for item in items:
+        value = valueof(item)
+        if value > binsize:
+            raise ValueError(f"Item {item} has size {value} which is larger than the bin size {binsize}.")
+        if not bin_sum + value <= binsize:
+            yield bin_items
+            bin_items, bin_sum = [], 0
+        bin_items.append(item)
+        bin_sum += value
+    if bin_items:
+        yield bin_items
+
+
+def first_fit(
+    binsize: float,
+    items: Iterable[Any],
+    valueof: Callable[[Any], float] = lambda x: x,
+    min_value: float = 0,
+    max_open_bins: int = None,
+) -> Iterator[List[Any]]:
+    """
+    Pack the given items by *First-Fit* over the open bins, in the order in which they were opened.
+    Each item costs O(number of open bins).
+
+    :param min_value: a lower bound on the values of all items. A bin is closed, and yielded,
+        as soon as an item of this value no longer fits into it.
+    :param max_open_bins: if given, when a new bin should be opened and there are already this many open bins,
+        the oldest open bin is closed first. Then the memory is bounded, but more bins may be used.
+
+    When no bin is closed before the end, the bins are the same as those of the non-streaming first-fit:
+    >>> list(first_fit(binsize=9, items=[1,2,3,3,5,9,9]))
+    [[1, 2, 3, 3], [5], [9], [9]]
+    >>> list(first_fit(binsize=9, items=[1,2,3,3,5,9,9], min_value=1))
+    [[1, 2, 3, 3], [9], [9], [5]]
+    >>> list(first_fit(binsize=10, items=[6,5,4,3,2,1], max_open_bins=1))
+    [[6], [5, 4], [3, 2, 1]]
+
+    An unbounded stream:
+    >>> import itertools
+    >>> bins = first_fit(binsize=10, items=itertools.cycle([6,3,5,2]), min_value=2, max_open_bins=3)
+    >>> list(itertools.islice(bins, 3))
+    [[6, 3], [5, 2, 3], [6, 2]]
+    """
+    if max_open_bins is not None and max_open_bins < 1:
+        raise ValueError(f"max_open_bins={max_open_bins} should be at least 1.")
+    open_bins = []  # pairs [sum, items], in the order in which they were opened.
+    for item in items:
+        value = valueof(item)
+        if value > binsize:
+            raise ValueError(f"Item {item} has size {value} which is larger than the bin size {binsize}.")
+        if value < min_value:
+            raise ValueError(f"Item {item} has size {value} which is smaller than min_value {min_value}.")
+        for open_bin in open_bins:
+            if open_bin[0] + value <= binsize:
+                break
+        else:  # if the item does not fit into any open bin
+            if max_open_bins is not None and len(open_bins) >= max_open_bins:
+                yield open_bins.pop(0)[1]
+            open_bin = [0, []]
+            open_bins.append(open_bin)
+        open_bin[0] += value
+        open_bin[1].append(item)
+        if not open_bin[0] + min_value <= binsize:
+            open_bins.remove(open_bin)
+            yield open_bin[1]
+    for open_bin in open_bins:
+        yield open_bin[1]
+
+
+if __name__ == "__main__":
+    import doctest
+
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
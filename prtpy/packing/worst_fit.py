@@ -0,0 +1,104 @@
+"""
+    Pack the numbers using the worst-fit and almost-worst-fit bin-packing algorithms:
+       https://en.wikipedia.org/wiki/Bin_packing_problem#Online_heuristics
+
+    The bins are kept in a heap by their sums, so each item is handled in O(log B) time, where B is the number of bins.
+"""
+
+from typing import Callable, List, Any
+from heapq import heapify, heappop, heappush, heapreplace
+from prtpy import outputtypes as out, Bins
+
+
+def online(bins: Bins, binsize: float, items: List[any], valueof: Callable[[Any], float] = lambda x: x):
+    """
+    Pack the given items into bins using the online *Worst-Fit* algorithm.
+    Each item is added to the bin with the smallest sum (the first one, if there are several), if it fits there;
+    otherwise a new bin is opened.
+
+    >>> from prtpy.bins import BinsKeepingContents, BinsKeepingSums
+    >>> online(BinsKeepingContents(), binsize=9, items=[1,2,3,3,5,9,9]).bins
+    [[1, 2, 3, 3], [5], [9], [9]]
+    >>> online(BinsKeepingContents(), binsize=10, items=[6,5,2,3]).bins
+    [[6, 3], [5, 2]]
+
+    >>> from prtpy import pack
+    >>> pack(algorithm=online, binsize=60, items=[44, 24, 24, 22, 21, 17, 8, 8, 6, 6], outputtype=out.Sums)
+    array([58., 56., 60.,  6.])
+    """
+    bins.add_empty_bins(1)
+    heap = [(bins.sums[ibin], ibin) for ibin in range(bins.num)]
+    heapify(heap)
+    for item in items:
+        value = valueof(item)
+        if value > binsize:
+            raise ValueError(f"Item {item} has size {value} which is larger than the bin size {binsize}.")
+        ibin = heap[0][1]
+        if bins.sums[ibin] + value <= binsize:
+            bins.add_item_to_bin(item, ibin)
+            heapreplace(heap, (bins.sums[ibin], ibin))
+        else:  # if the item does not fit into any bin
+            bins.add_empty_bins(1)
+            ibin = bins.num - 1
+            bins.add_item_to_bin(item, ibin)
+            heappush(heap, (bins.sums[ibin], ibin))
+    return bins
+
+
+def almost_worst_fit(bins: Bins, binsize: float, items: List[any], valueof: Callable[[Any], float] = lambda x: x):
+    """
+    Pack the given items into bins using the online *Almost-Worst-Fit* algorithm.
+    Each item is added to the bin with the second-smallest sum, if it fits there; otherwise to the bin with the smallest sum,
+    if it fits there; otherwise a new bin is opened.
+
+    >>> from prtpy.bins import BinsKeepingContents
+    >>> almost_worst_fit(BinsKeepingContents(), binsize=9, items=[1,2,3,3,5,9,9]).bins
+    [[1, 2, 3, 3], [5], [9], [9]]
+    >>> almost_worst_fit(BinsKeepingContents(), binsize=10, items=[5,3,2,6,1,4]).bins
+    [[5, 3, 2], [6, 1], [4]]
+    >>> almost_worst_fit(BinsKeepingContents(), binsize=10, items=[6,5,2,3]).bins
+    [[6, 2], [5, 3]]
+    """
+    bins.add_empty_bins(1)
+    heap = [(bins.sums[ibin], ibin) for ibin in range(bins.num)]
+    heapify(heap)
+    for item in items:
+        value = valueof(item)
+        if value > binsize:
+            raise ValueError(f"Item {item} has size {value} which is larger than the bin size {binsize}.")
+        smallest = heappop(heap)
+        if heap and bins.sums[heap[0][1]] + value <= binsize:  # the bin with the second-smallest sum
+            ibin = heap[0][1]
+            bins.add_item_to_bin(item, ibin)
+            heapreplace(heap, (bins.sums[ibin], ibin))
+            heappush(heap, smallest)
+        elif bins.sums[smallest[1]] + value <= binsize:
+            ibin = smallest[1]
+            bins.add_item_to_bin(item, ibin)
+            heappush(heap, (bins.sums[ibin], ibin))
+        else:  # if the item does not fit into any bin
+            heappush(heap, smallest)
+            bins.add_empty_bins(1)
+            ibin = bins.num - 1
+            bins.add_item_to_bin(item, ibin)
+            heappush(heap, (bins.sums[ibin], ibin))
+    return bins
+
+
+def decreasing(bins: Bins, binsize: float, items: List[any], valueof: Callable[[Any], float] = lambda x: x):
+    """
+    Pack the given items into bins using the *Worst-Fit-Decreasing* algorithm.
+    It sorts the items by descending value, and then runs worst-fit.
+
+    >>> from prtpy.bins import BinsKeepingContents
+    >>> decreasing(BinsKeepingContents(), binsize=10, items=[5,3,2,6,1,4]).bins
+    [[6, 3], [5, 4], [2, 1]]
+    """
+    return online(bins, binsize, sorted(items, key=valueof, reverse=True), valueof)
+
+
+if __name__ == "__main__":
+    import doctest
+
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
@@ -42,6 +42,9 @@ def partition(
 
     :param outputtype: defines the output format. See `outputtypes.py'.
 
+    :param with_lower_bound: passed to the algorithm, for algorithms that support it (e.g. `ilp.optimal').
+        The algorithm then returns a tuple (bins, lower bound, gap), and the output is a tuple (output, lower bound, gap).
+
     :return: a partition, or a list of sums - depending on outputtype.
 
     >>> import prtpy
@@ -70,6 +73,9 @@ def partition(
             valueof = lambda item: item
     bins = outputtype.create_empty_bins(numbins)
     bins.set_valueof(valueof)
+    if kwargs.get("with_lower_bound", False):
+        bins, lower_bound, gap = algorithm(bins, item_names, valueof, **kwargs)
+        return outputtype.extract_output_from_bins(bins), lower_bound, gap
     bins = algorithm(bins, item_names, valueof, **kwargs)
     return outputtype.extract_output_from_bins(bins)
 
@@ -7,13 +7,20 @@ Since: 2022-02
 Credit: Rob Pratt, https://or.stackexchange.com/a/6115/2576
 """
 
-from typing import List, Callable, Any
+from typing import List, Callable, Any, Tuple
 from numbers import Number
 from prtpy import objectives as obj, outputtypes as out, Bins
+from prtpy.incumbent import Incumbent
+from prtpy import highs
 from math import inf
+import numpy as np
+from scipy import sparse
+import logging
 
 import mip
 
+logger = logging.getLogger(__name__)
+
 
 def optimal(
     bins: Bins,
@@ -22,8 +29,10 @@ def optimal(
     objective: obj.Objective = obj.MinimizeDifference,
     copies=1,
     max_seconds=inf,
-    additional_constraints:Callable=lambda sums:[],
+    additional_constraints:Callable=None,
     weights:List[float]=None,
+    backend:str="mip",
+    with_lower_bound:bool=False,
     verbose=0
 ):
     """
@@ -35,9 +44,18 @@ def optimal(
     :param objective: whether to maximize the smallest sum, minimize the largest sum, etc.
     :param outputtype: whether to return the entire partition, or just the sums, etc.
     :param copies: how many copies there are of each item. Default: 1.
-    :param max_seconds: stop the computation after this number of seconds have passed.
+    :param max_seconds: stop the computation after this number of seconds have passed, and return the best partition found so far.
     :param additional_constraints: a function that accepts the list of sums in ascending order, and returns a list of possible additional constraints on the sums.
     :param weights: if given, must be of size bins.num. Divides each sum by its weight before applying the objective function.
+    :param backend: "mip" to solve with python-mip (CBC by default), or "highs" to build the model as sparse matrices and solve it with HiGHS through scipy.optimize.milp.
+    :param with_lower_bound: if True, return a tuple (bins, lower bound, gap), where the lower bound on the objective value is proven by the solver.
+
+    If the time runs out before optimality is proved, the best partition found so far is returned, and a warning with its gap is logged.
+    A ValueError is raised only if no feasible partition was found.
+
+    When every item has a single copy, the bins have equal weights and there are no additional constraints,
+    the model uses binary variables and orbitopal symmetry-breaking constraints instead of ordering the bin sums,
+    which makes the LP relaxation much tighter.
 
     >>> from prtpy.bins import BinsKeepingContents, BinsKeepingSums
     >>> optimal(BinsKeepingContents(2), [11.1,11,11,11,22], objective=obj.MaximizeSmallestSum).sums
@@ -74,58 +92,265 @@ def optimal(
     array([22. , 44.1])
     >>> optimal(BinsKeepingContents(2), items, objective=obj.MaximizeSmallestSum, weights=[10,2]).sums
     array([55. , 11.1])
+    >>> optimal(BinsKeepingContents(2), [], objective=obj.MinimizeLargestSum, additional_constraints=lambda sums: []).sums
+    array([0., 0.])
+
+    The HiGHS backend accepts the same parameters:
+    >>> optimal(BinsKeepingContents(3), walter_numbers, objective=obj.MinimizeLargestSum, backend="highs").sums
+    array([53., 62., 62.])
+    >>> optimal(BinsKeepingContents(3), walter_numbers, objective=obj.MinimizeLargestSum, additional_constraints=lambda sums: [sums[0]==0], backend="highs").sums
+    array([ 0., 88., 89.])
+    >>> optimal(BinsKeepingContents(2), items, objective=obj.MaximizeSmallestSum, weights=[1,2], backend="highs").sums
+    array([22. , 44.1])
+    >>> optimal(BinsKeepingContents(3), [1,2,3], copies=2, objective=obj.MinimizeDifference, backend="highs").sums
+    array([4., 4., 4.])
+    >>> for backend in ["mip", "highs"]:
+    ...     print(optimal(BinsKeepingSums(2), [22,27,10,30], objective=obj.MinimizeLargestSum, additional_constraints=lambda sums: [], backend=backend).sums)
+    [40. 49.]
+    [40. 49.]
+    >>> for backend in ["mip", "highs"]:
+    ...     print(optimal(BinsKeepingSums(2), [24,3,3,17,18], objective=obj.MinimizeDifference, backend=backend).sums)
+    [30. 35.]
+    [30. 35.]
+
+    Return the partition with the proven lower bound and the gap:
+    >>> bins, lower_bound, gap = optimal(BinsKeepingSums(3), walter_numbers, objective=obj.MinimizeLargestSum, with_lower_bound=True)
+    >>> bins.sums, lower_bound, gap
+    (array([53., 62., 62.]), 62.0, 0)
 
     >>> from prtpy import partition
     >>> partition(algorithm=optimal, numbins=3, items={"a":1, "b":2, "c":3, "d":3, "e":5, "f":9, "g":9})
-    [['a', 'g'], ['c', 'd', 'e'], ['b', 'f']]
+    [['a', 'f'], ['b', 'g'], ['c', 'd', 'e']]
     >>> partition(algorithm=optimal, numbins=2, items={"a":1, "b":2, "c":3, "d":3, "e":5, "f":9, "g":9}, outputtype=out.Sums)
     array([16., 16.])
+    >>> partition(algorithm=optimal, numbins=2, items=[1,2,3,3,5,9,9], objective=obj.MinimizeLargestSum, outputtype=out.LargestSum, with_lower_bound=True)
+    (16.0, 16.0, 0)
     """
 
-    ibins = range(bins.num)
     items = list(items)
+    if len(items) == 0:  # all sums are 0; python-mip cannot minimize the constant objective of an empty model.
+        objective_value = objective.get_value_to_minimize(np.zeros(bins.num), are_sums_in_ascending_order=True)
+        return (bins, objective_value, 0) if with_lower_bound else bins
     iitems = range(len(items))
     if isinstance(copies, Number):
         copies = {iitem: copies for iitem in iitems}
     if weights is None:
         weights = bins.num*[1]
+    values = [valueof(item) for item in items]
+
+    # When each item appears once, the counts are 0/1 variables.
+    is_binary = all(copies[iitem]==1 for iitem in iitems)
+    # When the bins are interchangeable, we can break the symmetry between them much more strongly than by ordering the sums.
+    use_orbitopal = is_binary and additional_constraints is None and len(set(weights))<=1 and objective in _LINEAR_OBJECTIVES
 
+    if backend == "mip":
+        solve = _solve_with_mip
+    elif backend == "highs":
+        solve = _solve_with_highs
+    else:
+        raise ValueError(f"Unknown ILP backend {backend}. Should be 'mip' or 'highs'.")
+    counts, objective_value, lower_bound, is_optimal = solve(  # counts[i][j] is the number of times item i appears in bin j.
+        values, [copies[iitem] for iitem in iitems], weights, bins.num, objective,
+        is_binary, use_orbitopal, additional_constraints, max_seconds, verbose,
+    )
+    bins = _fill_bins(bins, items, values, weights, counts, use_orbitopal)
+    gap = Incumbent(bins, objective_value, lower_bound, is_optimal).gap
+    if not is_optimal:
+        logger.warning("The ILP solver stopped before proving optimality: objective value %g, lower bound %g, gap %.2f%%.",
+            objective_value, lower_bound, 100*gap)
+    if with_lower_bound:
+        return bins, lower_bound, gap
+    return bins
+
+
+def _fill_bins(bins: Bins, items: List[Any], values: List[float], weights: List[float], counts: np.ndarray, use_orbitopal: bool) -> Bins:
+    """
+    Construct the output from the solution counts. The output bins are ordered by ascending sum, whichever formulation was used.
+    """
+    solution_sums = (np.asarray(values, dtype=float) @ counts) / np.asarray(weights, dtype=float) if len(items) > 0 else np.zeros(bins.num)
+    solution_bins = sorted(range(bins.num), key=lambda ibin: solution_sums[ibin]) if use_orbitopal else range(bins.num)
+    for ibin, solution_bin in enumerate(solution_bins):
+        for iitem in range(len(items)):
+            for _ in range(counts[iitem][solution_bin]):
+                bins.add_item_to_bin(items[iitem], ibin)
+    return bins
+
+
+def _solve_with_mip(values, copies, weights, numbins, objective, is_binary, use_orbitopal, additional_constraints, max_seconds, verbose) -> Tuple:
+    """
+    Build the model with python-mip and solve it (with CBC by default).
+    Return a tuple (counts, objective value, lower bound, is optimal).
+    """
+    ibins = range(numbins)
+    iitems = range(len(values))
     model = mip.Model("partition")
+    var_type = mip.BINARY if is_binary else mip.INTEGER
     counts: dict = {
-        iitem: [model.add_var(var_type=mip.INTEGER) for ibin in ibins] for iitem in iitems
+        iitem: [model.add_var(var_type=var_type) for ibin in ibins] for iitem in iitems
     }  # counts[i][j] determines how many times item i appears in bin j.
     bin_sums = [
-        sum([counts[iitem][ibin] * valueof(items[iitem]) for iitem in iitems])/weights[ibin] for ibin in ibins
+        sum([counts[iitem][ibin] * values[iitem] for iitem in iitems])/weights[ibin] for ibin in ibins
     ]
 
-    model.objective = mip.minimize(
-        objective.get_value_to_minimize(bin_sums, are_sums_in_ascending_order=True)        
-    )
-
     # Construct the list of constraints:
-    counts_are_non_negative = [counts[iitem][ibin] >= 0 for ibin in ibins for iitem in iitems]
     each_item_in_one_bin = [
         sum([counts[iitem][ibin] for ibin in ibins]) == copies[iitem] for iitem in iitems
     ]
-    bin_sums_in_ascending_order = [  # a symmetry-breaker
-        bin_sums[ibin + 1] >= bin_sums[ibin] for ibin in range(bins.num - 1)
-    ]
-    constraints = counts_are_non_negative + each_item_in_one_bin + bin_sums_in_ascending_order + additional_constraints(bin_sums)
+    constraints = each_item_in_one_bin
+    if use_orbitopal:
+        model.objective = mip.minimize(
+            _linear_objective(objective, bin_sums, values, weights[0], lambda: model.add_var(lb=-inf), model.add_constr)
+        )
+        ranked = _ranked_items(values)
+        for rank, iitem in enumerate(ranked):
+            for ibin in range(rank + 1, numbins):
+                constraints.append(counts[iitem][ibin] == 0)
+            for ibin in range(1, min(rank + 1, numbins)):
+                constraints.append(
+                    counts[iitem][ibin] <= mip.xsum(counts[ranked[previous]][ibin - 1] for previous in range(rank))
+                )
+    else:
+        model.objective = mip.minimize(
+            objective.get_value_to_minimize(bin_sums, are_sums_in_ascending_order=True)
+        )
+        constraints += _sum_constraints(objective, bin_sums, values, weights, additional_constraints)
     for constraint in constraints: model += constraint
 
     # Solve the ILP:
     model.verbose = verbose
     status = model.optimize(max_seconds=max_seconds)
-    if status != mip.OptimizationStatus.OPTIMAL:
+    if status == mip.OptimizationStatus.OPTIMAL:
+        return _mip_counts(counts, ibins, iitems), model.objective_value, model.objective_value, True
+    elif status == mip.OptimizationStatus.FEASIBLE:
+        lower_bound = model.objective_bound if model.objective_bound is not None else -inf
+        return _mip_counts(counts, ibins, iitems), model.objective_value, min(lower_bound, model.objective_value), False
+    else:
         raise ValueError(f"Problem status is not optimal - it is {status}.")
 
-    # Construct the output:
-    for ibin in ibins:
-        for iitem in iitems:
-            count_item_in_bin = int(counts[iitem][ibin].x)
-            for _ in range(count_item_in_bin):
-                bins.add_item_to_bin(items[iitem], ibin)
-    return bins
+
+def _mip_counts(counts: dict, ibins: range, iitems: range) -> np.ndarray:
+    return np.array([[int(round(counts[iitem][ibin].x)) for ibin in ibins] for iitem in iitems], dtype=int).reshape(len(iitems), len(ibins))
+
+
+def _solve_with_highs(values, copies, weights, numbins, objective, is_binary, use_orbitopal, additional_constraints, max_seconds, verbose) -> Tuple:
+    """
+    Build the same model as _solve_with_mip, with the assignment constraints as sparse matrices, and solve it with HiGHS.
+    Return a tuple (counts, objective value, lower bound, is optimal).
+    """
+    numitems = len(values)
+    values = np.asarray(values, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    model = highs.Model()
+    counts = model.add_vars(numitems * numbins, ub=1 if is_binary else inf, integer=True).reshape(numitems, numbins)
+    # The sums are bounded by the sums of the negative and of the positive values; free sum variables mislead HiGHS.
+    copies = np.asarray(copies, dtype=float)
+    sum_bounds = np.sort(np.outer([np.minimum(values, 0) @ copies, np.maximum(values, 0) @ copies], 1 / weights), axis=0)
+    sums = model.add_vars(numbins, lb=sum_bounds[0], ub=sum_bounds[1])
+    bin_sums = [highs.LinearExpression({int(sums[ibin]): 1}) for ibin in range(numbins)]
+
+    # Each item is in one bin: sum_j counts[i][j] == copies[i].
+    model.add_sparse_constraints(
+        sparse.coo_matrix((np.ones(counts.size), (np.repeat(np.arange(numitems), numbins), counts.ravel())), shape=(numitems, model.num_vars)),
+        copies, copies,
+    )
+    # Define the bin sums: weights[j]*sums[j] - sum_i values[i]*counts[i][j] == 0.
+    model.add_sparse_constraints(
+        sparse.coo_matrix((
+            np.concatenate((-np.repeat(values, numbins), weights)),
+            (np.concatenate((np.tile(np.arange(numbins), numitems), np.arange(numbins))), np.concatenate((counts.ravel(), sums))),
+        ), shape=(numbins, model.num_vars)),
+        0, 0,
+    )
+
+    if use_orbitopal:
+        objective_expression = _linear_objective(objective, bin_sums, values, weights[0], lambda: model.add_var(lb=sum_bounds[0].min(), ub=sum_bounds[1].max()), model.add_constraint)
+        ranked = np.array(_ranked_items(values), dtype=int).reshape(numitems)
+        ranked_counts = counts[ranked]  # ranked_counts[r][j] is the variable of the item of rank r in bin j.
+        ranks, ibins = np.indices((numitems, numbins))
+        model.ub[ranked_counts[ibins > ranks]] = 0
+        # For each rank r and bin 1<=j<=r: ranked_counts[r][j] - sum_{r'<r} ranked_counts[r'][j-1] <= 0.
+        row_ranks, row_bins = np.nonzero((ibins >= 1) & (ibins <= ranks))
+        numrows = len(row_ranks)
+        entry_rows = np.repeat(np.arange(numrows), row_ranks)
+        entry_ranks = np.arange(len(entry_rows)) - np.repeat(np.cumsum(row_ranks) - row_ranks, row_ranks)
+        model.add_sparse_constraints(
+            sparse.coo_matrix((
+                np.concatenate((np.ones(numrows), -np.ones(len(entry_rows)))),
+                (np.concatenate((np.arange(numrows), entry_rows)),
+                 np.concatenate((ranked_counts[row_ranks, row_bins], ranked_counts[entry_ranks, row_bins[entry_rows] - 1]))),
+            ), shape=(numrows, model.num_vars)),
+            -inf, 0,
+        )
+    else:
+        objective_expression = objective.get_value_to_minimize(bin_sums, are_sums_in_ascending_order=True)
+        for constraint in _sum_constraints(objective, bin_sums, values, weights, additional_constraints):
+            model += constraint
+
+    result = model.optimize(objective_expression, max_seconds=max_seconds, verbose=verbose)
+    if result.x is None:
+        raise ValueError(f"Problem status is not optimal - it is {result.message}")
+    solution_counts = np.round(result.x[counts]).astype(int)
+    if result.status == 0:
+        return solution_counts, result.fun, result.fun, True
+    else:
+        return solution_counts, result.fun, min(result.fun, result.mip_dual_bound), False
+
+
+_LINEAR_OBJECTIVES = (obj.MinimizeLargestSum, obj.MaximizeSmallestSum, obj.MinimizeDifference)
+
+
+def _ranked_items(values: List[float]) -> List[int]:
+    """
+    The item indices, ordered by descending value.
+    """
+    return sorted(range(len(values)), key=lambda iitem: values[iitem], reverse=True)
+
+
+def _sum_constraints(objective: obj.Objective, bin_sums: list, values: List[float], weights: List[float], additional_constraints: Callable) -> list:
+    """
+    Constraints on the bin sums for the general formulation: the sums are in ascending order (a symmetry-breaker),
+    cuts for the largest sum, and the user's additional constraints.
+    """
+    constraints = [
+        bin_sums[ibin + 1] >= bin_sums[ibin] for ibin in range(len(bin_sums) - 1)
+    ]
+    if objective is obj.MinimizeLargestSum and len(set(weights))<=1:
+        constraints += _largest_sum_cuts(bin_sums[-1], values, len(bin_sums), weights[0])
+    if additional_constraints is not None:
+        constraints += additional_constraints(bin_sums)
+    return constraints
+
+
+def _linear_objective(objective: obj.Objective, bin_sums: list, values: List[float], weight: float, add_var: Callable, add_constraint: Callable):
+    """
+    Return an objective that does not depend on the order of the bins,
+    using auxiliary variables for the largest and smallest sums.
+    """
+    largest_sum = add_var()
+    smallest_sum = add_var()
+    for bin_sum in bin_sums:
+        add_constraint(largest_sum >= bin_sum)
+        add_constraint(smallest_sum <= bin_sum)
+    add_constraint(smallest_sum <= sum(values) / len(bin_sums) / weight)
+    for cut in _largest_sum_cuts(largest_sum, values, len(bin_sums), weight):
+        add_constraint(cut)
+    if objective is obj.MinimizeLargestSum:
+        return largest_sum
+    elif objective is obj.MaximizeSmallestSum:
+        return -smallest_sum
+    else:  # obj.MinimizeDifference
+        return largest_sum - smallest_sum
+
+
+def _largest_sum_cuts(largest_sum, values: List[float], numbins: int, weight: float) -> list:
+    """
+    Valid lower bounds on the largest sum: the average sum, and (for non-negative values) the largest item.
+    They are redundant for integer solutions, but tighten the LP relaxation.
+    """
+    cuts = [largest_sum >= sum(values) / numbins / weight]
+    if len(values) > 0 and min(values) >= 0:
+        cuts.append(largest_sum >= max(values) / weight)
+    return cuts
 
 
 if __name__ == "__main__":
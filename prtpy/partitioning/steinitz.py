@@ -12,17 +12,28 @@ The paper was published in 2019.
 Link of the paper: https://arxiv.org/abs/1707.00481
 In the paper, two algorithms are designed to solved IP problems. We decide to implements the first algorithm designed in the paper.
 The algorithm is essentially based on the Steinitz Lemma. This is the starting point of the IP solver improvement.
+The second algorithm (proximity_ip) first solves the LP relaxation, and then runs the first algorithm only near the LP optimum.
 """
 
 
 import numpy as np
-import networkx as nx
-from itertools import product
+from scipy import sparse
+from scipy.optimize import linprog
+from dataclasses import dataclass, replace
+from collections import OrderedDict
+from typing import Callable, List, Any, Tuple
+import atexit
+import hashlib
 import logging
+import os
 import time
-import threading
-from multiprocessing import Pool
-from multiprocessing import freeze_support
+from multiprocessing import Pool, resource_tracker
+from multiprocessing.pool import ThreadPool
+from multiprocessing.shared_memory import SharedMemory
+
+from prtpy import Bins, BinsKeepingSums, objectives as obj
+from prtpy.partitioning.greedy import greedy
+from prtpy import integer_programing_partitionning as ipp
 
 
 # If you want the debug loggings to be printed in the terminal, uncomment this line.
@@ -37,195 +48,759 @@ logging.basicConfig(level=logging.INFO)
 # MUTLIPROCESSING = True
 # MUTLIPROCESSING = False
 
-def steinitz_ip(c:np.ndarray, A:np.ndarray, b:np.ndarray)->str:
+def optimal(bins: Bins, items: List[Any], valueof: Callable[[Any], int] = lambda x: x, objective: obj.Objective = obj.MinimizeLargestSum, solver: Callable = None, cache:"GraphCache"=None)->Bins:
+    '''
+    Partition the items so as to minimize the largest sum, by solving integer programs with the Steinitz algorithm.
+    The IP of prtpy.integer_programing_partitionning, for a capacity C, is feasible iff some partition has all sums at most C.
+    The smallest feasible C is found by binary search, between max(ceil(sum/k), largest item) and the largest sum of the greedy partition.
+    The item values must be non-negative integers.
+
+    :param objective: must be obj.MinimizeLargestSum, the only objective that this algorithm supports; otherwise a ValueError is raised.
+    :param solver: the IP solver, steinitz_ip (the default) or proximity_ip.
+    :param cache: an optional GraphCache, which keeps the graphs for the next calls with the same items.
+
+    >>> from prtpy.bins import BinsKeepingContents
+    >>> optimal(BinsKeepingContents(2), [11, 25, 2, 3, 4, 5]).bins
+    [[11, 2, 3, 4, 5], [25]]
+    >>> optimal(BinsKeepingContents(3), [4, 5, 6, 7, 8]).sums
+    array([11., 11.,  8.])
+
+    >>> from prtpy import partition
+    >>> partition(algorithm=optimal, numbins=2, items={"a":1, "b":2, "c":3, "d":3, "e":5, "f":9, "g":9})
+    [['a', 'c', 'd', 'f'], ['b', 'e', 'g']]
+    >>> partition(algorithm=optimal, numbins=2, items=[1, 2, 3], objective=obj.MinimizeDifference)
+    Traceback (most recent call last):
+    ...
+    ValueError: The Steinitz algorithm supports only the objective MinimizeLargestSum.
+    '''
+    if objective is not obj.MinimizeLargestSum:
+        raise ValueError("The Steinitz algorithm supports only the objective MinimizeLargestSum.")
+    if solver is None:
+        solver = steinitz_ip
+    items = list(items)
+    if bins.num == 0 or len(items) == 0:
+        return bins
+    values = [valueof(item) for item in items]
+    A = ipp.build_A_for_partition(bins, values)
+    c = ipp.build_c_for_partition(A.shape[1])
+
+    def solve(capacity:int):
+        z = solver(c, A, ipp.build_b_for_partition(bins, values, capacity), cache=cache)
+        return None if isinstance(z, str) else z
+
+    lower = max(-(-int(sum(values)) // bins.num), int(max(values)))
+    upper = int(max(greedy(BinsKeepingSums(bins.num), values).sums))
+    # Invariant: every capacity below lower is infeasible, and best_z is a solution for capacity upper (None if not computed yet).
+    best_z = None
+    while lower < upper:
+        middle = (lower + upper) // 2
+        z = solve(middle)
+        logging.info('capacity {0}: {1}'.format(middle, 'feasible' if z is not None else 'not feasible'))
+        if z is None:
+            lower = middle + 1
+        else:
+            upper, best_z = middle, z
+    if best_z is None:
+        best_z = solve(upper)
+
+    assignment = best_z[: bins.num * len(items)].reshape(bins.num, len(items))
+    for ibin in range(bins.num):
+        for iitem in np.flatnonzero(assignment[ibin]):
+            bins.add_item_to_bin(items[iitem], ibin)
+    return bins
+
+
+def steinitz_ip(c:np.ndarray, A:np.ndarray, b:np.ndarray, cache:"GraphCache"=None):
     '''
-    Given the matrix A and the vectors b and c, this function return the result of the integer programming.
+    Given the matrix A and the vectors b and c, this function return the result of the integer programming:
+    a vector z* maximizing c.z subject to A.z = b and z >= 0 integer; or 'Not feasible'; or 'Unbounded'.
+    A may be a scipy.sparse matrix, and c a sparse 1 x n matrix; they are kept sparse.
+    If a GraphCache is given, the graph is taken from it when an IP with the same A and b was solved before.
 
-    # >>> steinitz_ip(np.array([0,0,0,0]), np.array([[1,1,0,0],[0,0,1,1],[1,0,1,0],[0,1,0,1]]), np.array([1,1,1,1]))
-    # '[1 0 1 0]'
+    >>> steinitz_ip(np.array([1,0,0,1]), np.array([[1,1,0,0],[0,0,1,1],[1,0,1,0],[0,1,0,1]]), np.array([1,1,1,1])).tolist()
+    [1, 0, 0, 1]
 
-    # >>> steinitz_ip(np.array([0,0,0,0]), np.array([[3, 1, 0, 0], [0, 0, 3, 1], [1, 0, 1, 0], [0, 1, 0, 1]]), np.array([2,2,1,1]))
-    # 'Not feasible'
+    >>> steinitz_ip(np.array([0,0,0,0]), np.array([[3, 1, 0, 0], [0, 0, 3, 1], [1, 0, 1, 0], [0, 1, 0, 1]]), np.array([2,2,1,1]))
+    'Not feasible'
     '''
-    G = setup(A, b, c)
+    A = _sparse(A)
+    G = setup(A, b, c, cache=cache)
 
-    source = str(np.array([0]*len(b), dtype=np.int8))
-    target = np.array2string(b)
-    if check_feasibility(G, source, target):
-        longest_path = tackle_optimization(G, source, target)
-        logging.info('Longest path from 0 to b: {0}'.format(longest_path))
-        z_star = longest_path[0][1]
-        return z_star
-    else:
+    source, target = G.node(np.zeros(len(b), dtype=np.int64)), G.node(b)
+    longest_path = tackle_optimization(G, source, target) if source >= 0 and target >= 0 else None
+    if longest_path is None:
         return 'Not feasible'
+    if longest_path == 'Unbounded':
+        return longest_path
+    logging.info('Longest path from 0 to b: {0}'.format(longest_path))
+    path, _ = longest_path
+    z_star = np.bincount(G.columns[path], minlength=A.shape[1])
+    return z_star
 
 
-def setup(A:np.ndarray, b:np.ndarray, c:np.ndarray, THREADS=False, MUTLIPROCESSING=False)->nx.DiGraph:
+def proximity_ip(c:np.ndarray, A:np.ndarray, b:np.ndarray, proximity:int=None, cache:"GraphCache"=None):
+    '''
+    The same as steinitz_ip, using the proximity between the LP and the IP optimum.
+    The LP relaxation is solved first, at a vertex x*. By the proximity theorem of the paper,
+    some optimal IP solution z* satisfies ||x* - z*||_1 <= m(2m.Delta+1)^m, so z* >= l where l = max(0, ceil(x* - m(2m.Delta+1)^m)).
+    Substituting z = l + y leaves the IP max c.y subject to A.y = b - A.l and y >= 0 integer,
+    which is solved by the graph of steinitz_ip, around the segment from 0 to b - A.l instead of from 0 to b.
+
+    :param proximity: the radius around x* in which z* is searched. By default it is m(2m.Delta+1)^m, which guarantees an optimal solution;
+                      a smaller radius is faster, but the solution might be suboptimal, or not found at all.
+
+    >>> proximity_ip(np.array([1,1]), np.array([[1,2]]), np.array([1000])).tolist()
+    [1000, 0]
+    >>> proximity_ip(np.array([1,0,0,1]), np.array([[1,1,0,0],[0,0,1,1],[1,0,1,0],[0,1,0,1]]), np.array([1,1,1,1])).tolist()
+    [1, 0, 0, 1]
+    >>> proximity_ip(np.array([1,1]), np.array([[2,2]]), np.array([1001]))
+    'Not feasible'
+    >>> proximity_ip(np.array([1,0]), np.array([[1,-1]]), np.array([5]))
+    'Unbounded'
+    '''
+    A = _sparse(A)
+    b = np.asarray(b, dtype=np.int64)
+    m = len(b)
+    relaxation = linprog(-_column_weights(c, np.arange(A.shape[1])), A_eq=A, b_eq=b, bounds=(0, None), method='highs-ds')
+    logging.info('LP relaxation: {0}'.format(relaxation.message))
+    if relaxation.status == 2:
+        return 'Not feasible'
+    if relaxation.status != 0:
+        # The LP is unbounded, so the IP is either unbounded or infeasible.
+        return steinitz_ip(c, A, b, cache=cache)
+    if proximity is None:
+        Delta = int(abs(A).max())
+        proximity = m * (2 * m * Delta + 1) ** m
+    lower = np.maximum(0, np.ceil(relaxation.x - proximity - 1e-9)).astype(np.int64)
+    logging.info('x*:{0}, lower bound on z*:{1}'.format(relaxation.x, lower))
+    z_star = steinitz_ip(c, A, b - A @ lower, cache=cache)
+    if isinstance(z_star, str):
+        return z_star
+    return lower + z_star
+
+
+def setup(A:np.ndarray, b:np.ndarray, c:np.ndarray, THREADS=False, MUTLIPROCESSING=False, pool:"EdgePool"=None, cache:"GraphCache"=None)->"Graph":
     '''
     This method set up all the variable requested by the algorithm.
+    With MUTLIPROCESSING, the edges are computed by the given EdgePool, or by a default pool with one process per CPU.
+    With a GraphCache, fancy_S and the graph are reused when they were built before for the same parameters.
     '''
-    n = len(A)
+    A = _sparse(A)
     m = len(b)
 
-    logging.info('A:{0} '.format(A))
+    logging.info('A: {0} matrix with {1} non-zeros'.format(A.shape, A.nnz))
     logging.info('b:{0} '.format(b))
     logging.info('c:{0} '.format(c))
 
-    Delta = max([max(map(float, entry)) for entry in np.absolute(A)])
+    Delta = int(abs(A).max())
     logging.info('Delta:{0} '.format(Delta))
     upper_bound = int(2 * m * Delta)
     logging.info('upper_bound:{0} '.format(upper_bound))
 
-    start_fancy_S = time.perf_counter()
-
-    fancy_S = build_fancy_S(b, m, upper_bound)
-    logging.debug('fancy_S:{0}'.format(fancy_S))
+    box = search_box(A, b, upper_bound)
+    logging.info('search box:{0} to {1}'.format(*box))
+
+    def compute_fancy_S():
+        start_fancy_S = time.perf_counter()
+        fancy_S = build_fancy_S(b, m, upper_bound, lows=box[0], highs=box[1])
+        logging.debug('fancy_S:{0}'.format(fancy_S))
+        finish_fancy_S= time.perf_counter()
+        logging.info(f'Finished fancy_S in {round(finish_fancy_S-start_fancy_S,2)} second(s)')
+        return fancy_S
+
+    def compute_graph():
+        fancy_S = compute_fancy_S() if cache is None else cache.fancy_S(b, upper_bound, box, compute_fancy_S)
+        start_build_graph = time.perf_counter()
+        G = build_graph(fancy_S, A, b, box, c, THREADS, MUTLIPROCESSING, pool)
+        finish_build_graph= time.perf_counter()
+        logging.info(f'Finished build_graph in {round(finish_build_graph-start_build_graph,2)} second(s)')
+        return G
+
+    if cache is None:
+        G = compute_graph()
+    else:
+        # The cached graph has no weights, since they depend on c.
+        G = cache.graph(A, b, upper_bound, box, compute_graph)
+        G = replace(G, weights=_column_weights(c, G.columns))
+    logging.info(f'The graph has {G.num_nodes} nodes and {G.num_edges} edges')
 
-    finish_fancy_S= time.perf_counter()
-    logging.info(f'Finished fancy_S in {round(finish_fancy_S-start_fancy_S,2)} second(s)')
+    return G
 
-    start_build_graph = time.perf_counter()
-    G = nx.DiGraph()
-    build_graph(fancy_S, n, A, G, upper_bound, c, THREADS, MUTLIPROCESSING)
-    finish_build_graph= time.perf_counter()
-    logging.info(f'Finished build_graph in {round(finish_build_graph-start_build_graph,2)} second(s)')
 
-    logging.debug('nodes:{0}'.format(G.nodes))
-    logging.debug('edges:{0}'.format(G.edges))
+def search_box(A:np.ndarray, b:np.ndarray, upper_bound:int)->Tuple[np.ndarray, np.ndarray]:
+    '''
+    The lowest and highest corners of a box containing all the points at distance at most upper_bound from the segment 0 -> b.
+    In the coordinates i where A has no negative entry (or no positive entry), the partial sums of a solution are monotone,
+    so the box is narrowed to the interval between 0 and b_i.
 
-    return G
+    >>> search_box(np.array([[1, 2], [1, -1]]), np.array([5, 1]), 4)
+    (array([ 0, -4]), array([5, 5]))
+    '''
+    A, b = _sparse(A), np.asarray(b, dtype=np.int64)
+    lows, highs = np.minimum(b, 0), np.maximum(b, 0)
+    monotone = (A.min(axis=1).toarray().ravel() >= 0) | (A.max(axis=1).toarray().ravel() <= 0)
+    return np.where(monotone, lows, lows - upper_bound), np.where(monotone, highs, highs + upper_bound)
 
 
-def build_fancy_S(b:np.ndarray, m:int, upper_bound:int)->np.ndarray:
+def build_fancy_S(b:np.ndarray, m:int, upper_bound:int, chunk_size:int=1<<16, lows:np.ndarray=None, highs:np.ndarray=None)->np.ndarray:
     '''
-    The set fancy_S consists of all points x in Z^m for which there exists a j in {1,...,t} with:
-    ||x-(j/t).b||_\infinity <= 2m . \Delta. 
+    The set fancy_S consists of all integer points x in the box lows <= x <= highs for which there exists a j in {1,...,t} with:
+    ||x-(j/t).b||_\\infinity <= upper_bound, where t = ||b||_1 and upper_bound = 2m . \\Delta.
+    The default box is the smallest one containing all these points; setup uses the narrower box of search_box.
+
+    For each coordinate i, the condition |x_i - (j/t).b_i| <= upper_bound holds for an interval of j,
+    whose endpoints are computed in closed form with integer arithmetic.
+    x is in fancy_S iff the intersection of these intervals and {1,...,t} is not empty.
+    The candidate points are generated in chunks of chunk_size, in lexicographic order.
+
+    >>> build_fancy_S(np.array([4, 0]), 2, 1, lows=np.array([0, 0]), highs=np.array([4, 0])).tolist()
+    [[0, 0], [1, 0], [2, 0], [3, 0], [4, 0]]
+    >>> build_fancy_S(np.array([2, 1]), 2, 1).tolist()
+    [[0, 0], [0, 1], [1, 0], [1, 1], [1, 2], [2, 0], [2, 1], [2, 2], [3, 0], [3, 1], [3, 2]]
+    >>> build_fancy_S(np.array([6, -2]), 2, 1, lows=np.array([0, -2]), highs=np.array([6, 0])).tolist()
+    [[0, -1], [0, 0], [1, -1], [1, 0], [2, -2], [2, -1], [2, 0], [3, -2], [3, -1], [3, 0], [4, -2], [4, -1], [4, 0], [5, -2], [5, -1], [6, -2], [6, -1]]
     '''
-    fancy_S = []
-    t = int(np.linalg.norm(b, ord=1))
+    b = np.asarray(b, dtype=np.int64)
+    if lows is None or highs is None:
+        lows, highs = np.minimum(b, 0) - upper_bound, np.maximum(b, 0) + upper_bound
+    lows, highs = np.asarray(lows, dtype=np.int64), np.asarray(highs, dtype=np.int64)
+    dtype = ipp.int_dtype(max(np.abs(lows).max(initial=0), np.abs(highs).max(initial=0)))
+    # When b = 0, the segment is the single point 0, and t = 1 makes fancy_S the ball of radius upper_bound around it.
+    t = max(int(np.linalg.norm(b, ord=1)), 1)
     logging.debug('t:{0}'.format(t))
-    x = np.array([0.] * m, dtype=np.int8)
-    possible_x = [vector for vector in product(range(0, upper_bound + 1), repeat = m)]
-    logging.debug('possible_x:{0}'.format(possible_x))
-    for x in possible_x:
-        for j in range(1,t+1):
-            logging.debug('j:{0}'.format(j))
-            logging.debug('||x-(j/t)*b||_infinity:{0}'.format(np.linalg.norm(x - ((j/t) * b), np.inf)))
-            if np.linalg.norm(x - ((j/t) * b), np.inf) <= upper_bound:
-                logging.debug('x:{0}'.format(x))
-                fancy_S.append(x)
-                break
-    return np.array(fancy_S, dtype=np.int8)
-
-
-def run_multiprocessing(func, n_processors, data):
+    positive, negative, zero = b > 0, b < 0, b == 0
+    shape = tuple((highs - lows + 1).tolist())
+    total = int(np.prod(shape))
+    fancy_S = []
+    for start in range(0, total, chunk_size):
+        x = np.stack(np.unravel_index(np.arange(start, min(start + chunk_size, total), dtype=np.int64), shape), axis=1) + lows
+        # |x_i - (j/t).b_i| <= upper_bound  iff  (x_i - upper_bound).t <= j.b_i <= (x_i + upper_bound).t
+        low = (x - upper_bound) * t
+        high = (x + upper_bound) * t
+        j_min = np.ones(len(x), dtype=np.int64)
+        j_max = np.full(len(x), t, dtype=np.int64)
+        if positive.any():
+            j_min = np.maximum(j_min, (-(-low[:, positive] // b[positive])).max(axis=1))
+            j_max = np.minimum(j_max, (high[:, positive] // b[positive]).min(axis=1))
+        if negative.any():
+            j_min = np.maximum(j_min, (-(-high[:, negative] // b[negative])).max(axis=1))
+            j_max = np.minimum(j_max, (low[:, negative] // b[negative]).min(axis=1))
+        admissible = j_min <= j_max
+        if zero.any():
+            admissible &= ((low[:, zero] <= 0) & (high[:, zero] >= 0)).all(axis=1)
+        fancy_S.append(x[admissible])
+    return np.concatenate(fancy_S).astype(dtype)
+
+
+@dataclass
+class Graph:
     '''
-    Define function to run mutiple processors and pool the results together
+    The digraph used to resolve the IP, in compressed sparse row (CSR) form.
+
+    Each node is a point x of the box lows <= x < lows + radices, encoded as the mixed-radix integer
+    whose i-th digit is x_i - lows_i. The nodes are numbered 0,...,num_nodes-1 by ascending code: codes[u] is the code of node u.
+    The edges leaving node u are offsets[u],...,offsets[u+1]-1:
+    edge e goes to node targets[e], adds the column columns[e] of A, and has weight weights[e].
+
+    >>> G = setup(np.array([[1,0],[0,1]]), np.array([2,3]), np.array([5,7]))
+    >>> G.num_nodes, G.num_edges
+    (12, 17)
+    >>> G.node([1, 2]), G.point(6).tolist()
+    (6, [1, 2])
+    >>> [(G.point(G.targets[e]).tolist(), int(G.columns[e]), int(G.weights[e])) for e in G.out_edges([G.node([1, 2])])]
+    [([2, 2], 0, 5), ([1, 3], 1, 7)]
     '''
-    with Pool(processes=n_processors) as pool:
-        return pool.starmap(func, data)
-
-
-def build_graph(fancy_S:np.ndarray, n:int, A:np.ndarray, G:nx.digraph, upper_bound:int, c:np.ndarray, THREADS=False, MUTLIPROCESSING=False):
+    codes: np.ndarray
+    lows: np.ndarray
+    radices: np.ndarray
+    offsets: np.ndarray
+    targets: np.ndarray
+    columns: np.ndarray
+    weights: np.ndarray
+
+    @property
+    def num_nodes(self)->int:
+        return len(self.codes)
+
+    @property
+    def num_edges(self)->int:
+        return len(self.targets)
+
+    def encode(self, points)->np.ndarray:
+        '''
+        The codes of the given points (one point per row), or -1 for the points outside the box.
+        '''
+        digits = np.asarray(points, dtype=np.int64) - self.lows
+        inside = ((digits >= 0) & (digits < self.radices)).all(axis=-1)
+        strides = np.append(np.cumprod(self.radices[:0:-1])[::-1], 1)
+        return np.where(inside, digits @ strides, -1)
+
+    def nodes_of(self, points)->np.ndarray:
+        '''
+        The nodes of the given points (one point per row), or -1 for the points that are not nodes.
+        '''
+        codes = self.encode(points)
+        nodes = np.minimum(np.searchsorted(self.codes, codes), self.num_nodes - 1)
+        return np.where((codes >= 0) & (self.codes[nodes] == codes), nodes, -1)
+
+    def node(self, point)->int:
+        '''
+        The node of the given point, or -1 if the point is not a node.
+        '''
+        return int(self.nodes_of(np.asarray(point)[np.newaxis])[0])
+
+    def point(self, node:int)->np.ndarray:
+        '''
+        The point of the given node.
+        '''
+        return np.array(np.unravel_index(self.codes[node], self.radices), dtype=np.int64) + self.lows
+
+    def out_edges(self, nodes)->np.ndarray:
+        '''
+        The indices of all the edges leaving the given nodes.
+        '''
+        return _out_edges(self.offsets, nodes)
+
+
+def _out_edges(offsets:np.ndarray, nodes)->np.ndarray:
+    nodes = np.asarray(nodes, dtype=np.int64)
+    starts = offsets[nodes]
+    counts = offsets[nodes + 1] - starts
+    ends = np.cumsum(counts)
+    # The edges of the k-th node are starts[k],...,starts[k]+counts[k]-1: shift one global range by a per-node offset.
+    return np.arange(ends[-1] if len(ends) else 0, dtype=np.int64) + np.repeat(starts - (ends - counts), counts)
+
+
+def build_graph(fancy_S:np.ndarray, A:np.ndarray, b:np.ndarray, box:Tuple[np.ndarray, np.ndarray], c:np.ndarray, THREADS=False, MUTLIPROCESSING=False, pool:"EdgePool"=None)->Graph:
     '''
     This method create the digraph used to resolve the IP.
+    The nodes are the points of fancy_S, 0 (the source) and b (the target); they are encoded within the given box (see search_box).
+    There is an edge x -> x + A_i, with weight c_i, for every node x and column A_i such that x + A_i is a node.
     '''
-    G.add_nodes_from(map(str, fancy_S))
-    columns = []
-    for i in range(n):
-        columns.append(np.array([row[i] for row in A], dtype=np.int8))
-    logging.debug('columns: {0}'.format(columns))
+    m, n = A.shape
+    fancy_S = np.asarray(fancy_S).reshape(-1, m)
+    b = np.asarray(b, dtype=np.int64)
+    lows, highs = (np.asarray(corner, dtype=np.int64) for corner in box)
+    radices = highs - lows + 1
+    if np.prod(radices.astype(float)) >= np.iinfo(np.int64).max:
+        raise ValueError(f"The box {radices} is too large to encode its points as 64-bit integers.")
+    G = Graph(np.zeros(0, dtype=np.int64), lows, radices, None, None, None, None)
+    # 0 and b are usually in fancy_S already, but not when b = 0 or when b has negative coordinates.
+    S_codes = G.encode(fancy_S)
+    ends = np.stack((np.zeros(m, dtype=np.int64), b))
+    ends = ends[~np.isin(G.encode(ends), S_codes)]
+    points = np.concatenate((fancy_S, ends.astype(fancy_S.dtype)))
+    point_codes = G.encode(points)
+    G.codes = np.unique(point_codes)
+    point_nodes = np.searchsorted(G.codes, point_codes)
+    logging.debug('codes:{0}'.format(G.codes))
 
     # Here the use of threads is not efficient since the time to create the threads is longer than the execution.
     start = time.perf_counter()
     if THREADS:
-        threads = []
-        for i in range(n):
-            t = threading.Thread(target = add_edge_to_G ,args = [G, fancy_S, columns, i, upper_bound, c])
-            t.start()
-            threads.append(t)
-        for thread in threads:
-            thread.join()
-    # Here the use of multiprocessing: this is more efficient.
-    elif MUTLIPROCESSING:
-        freeze_support()
-        n_processors = 6
-        data = [(G, fancy_S, columns, i, upper_bound, c) for i in range(n)]
-        edges = run_multiprocessing(collect_edge_to_G, n_processors, data)
-        for i in range(n):
-            for edge in edges[i]:
-                G.add_edge(edge[0], edge[1], weight=edge[2])
+        with ThreadPool(n) as thread_pool:
+            edges = thread_pool.starmap(column_edges, [(G, points, point_nodes, A, range(i, i+1)) for i in range(n)])
+    # Here the use of multiprocessing: the points are shared with the workers, and only the edges are sent back.
+    elif MUTLIPROCESSING or pool is not None:
+        edges = (pool or _default_pool()).edges(G, points, point_nodes, A)
     else:
-        for i in range(n):
-            add_edge_to_G(G, fancy_S, columns, i, upper_bound, c)
+        edges = [column_edges(G, points, point_nodes, A, range(n))]
     finish = time.perf_counter()
     logging.info(f'Finished in {round(finish-start,2)} second(s)')
 
+    sources, targets, columns = (np.concatenate(arrays) for arrays in zip(*edges))
+    order = np.argsort(sources, kind='stable')
+    G.offsets = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=G.num_nodes))))
+    G.targets = targets[order].astype(_index_dtype(G.num_nodes))
+    G.columns = columns[order].astype(_index_dtype(n))
+    G.weights = _column_weights(c, G.columns)
+    return G
+
+
+def _sparse(A)->sparse.csc_matrix:
+    '''
+    The matrix A (a numpy array or a scipy.sparse matrix) in compressed sparse column form, whose columns are cheap to extract.
+    '''
+    return sparse.csc_matrix(A)
+
+
+def _column_weights(c, columns:np.ndarray)->np.ndarray:
+    '''
+    The entries c[columns] of the vector c, which is either a numpy array or a sparse 1 x n matrix.
+    For a sparse c, only its stored non-zeros are looked up.
+
+    >>> _column_weights(np.array([5, 0, 7]), np.array([2, 2, 0])).tolist()
+    [7, 7, 5]
+    >>> _column_weights(sparse.csr_matrix(np.array([[5, 0, 7]])), np.array([2, 1, 0])).tolist()
+    [7, 0, 5]
+    '''
+    columns = np.asarray(columns)
+    if not sparse.issparse(c):
+        return np.asarray(c)[columns]
+    c = sparse.csr_matrix(c)
+    c.sort_indices()
+    weights = np.zeros(len(columns), dtype=c.dtype)
+    if c.nnz > 0:
+        positions = np.minimum(np.searchsorted(c.indices, columns), c.nnz - 1)
+        stored = c.indices[positions] == columns
+        weights[stored] = c.data[positions[stored]]
+    return weights
+
+
+def _index_dtype(size:int):
+    return np.int32 if size < np.iinfo(np.int32).max else np.int64
+
+
+class GraphCache:
+    '''
+    A least-recently-used cache of the sets fancy_S and of the graphs built by setup.
+    fancy_S depends only on b, the bound 2m.Delta and the search box; the graph depends also on the columns of A, but not on c.
+    So IPs that differ only in c share their graph, and setup sets its weights for each c.
+    If a directory is given, each entry is also saved there as a .npz file, and loaded from there when it is not in memory.
+
+    >>> cache = GraphCache(maxsize=4)
+    >>> A, b = np.array([[1,1,0,0],[0,0,1,1],[1,0,1,0],[0,1,0,1]]), np.array([1,1,1,1])
+    >>> steinitz_ip(np.array([1,0,0,1]), A, b, cache=cache).tolist()
+    [1, 0, 0, 1]
+    >>> steinitz_ip(np.array([0,1,1,0]), A, b, cache=cache).tolist()
+    [0, 1, 1, 0]
+    >>> cache.hits, cache.misses
+    (1, 2)
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     first = steinitz_ip(np.array([1,0,0,1]), A, b, cache=GraphCache(directory=directory))
+    ...     cache = GraphCache(directory=directory)
+    ...     second = steinitz_ip(np.array([0,1,1,0]), A, b, cache=cache)
+    >>> second.tolist(), cache.hits, cache.misses
+    ([0, 1, 1, 0], 1, 0)
+    '''
+
+    _GRAPH_ARRAYS = ('codes', 'lows', 'radices', 'offsets', 'targets', 'columns')
+
+    def __init__(self, maxsize:int=8, directory:str=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def fancy_S(self, b:np.ndarray, upper_bound:int, box:Tuple[np.ndarray, np.ndarray], build:Callable[[], np.ndarray])->np.ndarray:
+        '''
+        The set fancy_S of these parameters; computed by build() if it is not in the cache.
+        '''
+        return self._get('fancy_S', (b, upper_bound, *box), lambda: {'fancy_S': build()})['fancy_S']
+
+    def graph(self, A:np.ndarray, b:np.ndarray, upper_bound:int, box:Tuple[np.ndarray, np.ndarray], build:Callable[[], Graph])->Graph:
+        '''
+        The graph of these parameters, without weights; computed by build() if it is not in the cache.
+        '''
+        def build_arrays():
+            G = build()
+            return {name: getattr(G, name) for name in self._GRAPH_ARRAYS}
+        return Graph(weights=None, **self._get('graph', (A, b, upper_bound, *box), build_arrays))
+
+    def _get(self, kind:str, key_arrays:tuple, build:Callable[[], dict])->dict:
+        digest = hashlib.sha1(kind.encode())
+        for array in key_arrays:
+            if sparse.issparse(array):
+                # A sparse matrix is hashed by its canonical CSR arrays, without making it dense.
+                array = sparse.csr_matrix(array, copy=True)
+                array.sum_duplicates()
+                array.eliminate_zeros()
+                digest.update('sparse{0}'.format(array.shape).encode())
+                for part in (array.indptr, array.indices, array.data):
+                    digest.update(np.asarray(part, dtype=np.int64).tobytes())
+                continue
+            array = np.asarray(array, dtype=np.int64)
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+        key = '{0}-{1}'.format(kind, digest.hexdigest())
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        path = os.path.join(self.directory, key + '.npz') if self.directory is not None else None
+        if path is not None and os.path.exists(path):
+            self.hits += 1
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+        else:
+            self.misses += 1
+            arrays = build()
+            if path is not None:
+                # Write to a temporary file first, so that other processes never load a partial file.
+                temporary_path = '{0}.{1}.npz'.format(path[:-len('.npz')], os.getpid())
+                np.savez(temporary_path, **arrays)
+                os.replace(temporary_path, path)
+        self._entries[key] = arrays
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return arrays
+
+
+def column_edges(G:Graph, points:np.ndarray, point_nodes:np.ndarray, A:np.ndarray, columns:range, chunk_size:int=1<<16):
+    '''
+    The edges x -> x + A_i, for the given points x, whose nodes are point_nodes, and the given columns i.
+    Returns three int64 arrays: the source nodes, the target nodes and the columns.
+    The points are processed in chunks of chunk_size, to bound the memory of the intermediate arrays.
+    '''
+    sources, targets, counts = [], [], []
+    A = _sparse(A)
+    for i in columns:
+        count = 0
+        column = A[:, [i]].toarray().ravel()
+        for start in range(0, len(points), chunk_size):
+            heads = G.nodes_of(points[start:start + chunk_size].astype(np.int64) + column)
+            valid = heads >= 0
+            sources.append(point_nodes[start:start + chunk_size][valid].astype(np.int64))
+            targets.append(heads[valid])
+            count += len(targets[-1])
+        counts.append(count)
+    if not sources:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(sources), np.concatenate(targets), np.repeat(np.arange(columns.start, columns.stop), counts)
+
+
+class EdgePool:
+    '''
+    A pool of worker processes, that compute the edges of the graph in parallel.
+    For each graph, the points and the node codes are placed once in shared memory;
+    each worker computes the edges of a range of columns for a range of points, and returns them as int64 arrays.
+    The pool can be reused for many graphs, and should be closed at the end (or used in a with statement).
+
+    >>> A, b, c = np.array([[1,1,0,0],[0,0,1,1],[1,0,1,0],[0,1,0,1]]), np.array([1,1,1,1]), np.array([0,0,0,0])
+    >>> with EdgePool(processes=2) as pool:
+    ...     G = setup(A, b, c, pool=pool)
+    >>> H = setup(A, b, c)
+    >>> G.num_edges == H.num_edges and (G.targets == H.targets).all() and (G.offsets == H.offsets).all()
+    True
+    '''
+
+    def __init__(self, processes:int=None):
+        self.processes = processes or os.cpu_count()
+        # The workers should share the resource tracker of this process, which owns the shared memory blocks.
+        resource_tracker.ensure_running()
+        self._pool = Pool(self.processes)
+
+    def edges(self, G:Graph, points:np.ndarray, point_nodes:np.ndarray, A:np.ndarray):
+        '''
+        The edges of the graph, as a list of (sources, targets, columns) triples, like column_edges.
+        '''
+        n = A.shape[1]
+        arrays = (points, point_nodes, G.codes)
+        memories = [_share(array) for array in arrays]
+        try:
+            descriptions = [(memory.name, array.shape, array.dtype.str) for memory, array in zip(memories, arrays)]
+            # About one task per process: the columns are split first, and then the points.
+            column_ranges = [range(part[0], part[-1] + 1) for part in np.array_split(np.arange(n), min(n, self.processes))]
+            num_row_ranges = -(-self.processes // len(column_ranges))
+            row_bounds = np.linspace(0, len(points), num_row_ranges + 1).astype(int)
+            tasks = [
+                (descriptions, G.lows, G.radices, A, columns, (row_bounds[k], row_bounds[k+1]))
+                for columns in column_ranges for k in range(num_row_ranges)
+            ]
+            return self._pool.starmap(_shared_column_edges, tasks)
+        finally:
+            for memory in memories:
+                memory.close()
+                memory.unlink()
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _share(array:np.ndarray)->SharedMemory:
+    '''
+    Copy the array into a new shared memory block.
+    '''
+    memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[...] = array
+    return memory
+
+
+def _shared_column_edges(descriptions, lows, radices, A, columns, rows):
+    '''
+    The task of a worker of EdgePool: attach to the shared points, point nodes and codes, and compute the edges of the given columns and rows.
+    The blocks are owned, and unlinked, by the parent process.
+    '''
+    memories = [SharedMemory(name=name) for name, _, _ in descriptions]
+    try:
+        return _column_edges_of_shared_arrays(memories, descriptions, lows, radices, A, columns, rows)
+    finally:
+        for memory in memories:
+            memory.close()
+
+
+def _column_edges_of_shared_arrays(memories, descriptions, lows, radices, A, columns, rows):
+    # The arrays backed by the shared memory are released when this function returns, so the blocks can then be closed.
+    points, point_nodes, codes = (
+        np.ndarray(shape, dtype=dtype, buffer=memory.buf) for memory, (_, shape, dtype) in zip(memories, descriptions)
+    )
+    start, stop = rows
+    G = Graph(codes, lows, radices, None, None, None, None)
+    return column_edges(G, points[start:stop], point_nodes[start:stop], A, columns)
+
 
-def add_edge_to_G(G, fancy_S, columns, i, upper_bound, c):
-    for x in fancy_S:
-        y = x + columns[i]
-        if np.linalg.norm(y, np.inf) < upper_bound:
-            logging.debug('x: {0}'.format(x))
-            logging.debug('y: {0}'.format(y))
-            G.add_edge(str(x), str(y), weight=c[i])
+_pool = None
 
 
-def collect_edge_to_G(G, fancy_S, columns, i, upper_bound, c):
-    edges = []
-    for x in fancy_S:
-        y = x + columns[i]
-        if np.linalg.norm(y, np.inf) < upper_bound:
-            logging.debug('x: {0}'.format(x))
-            logging.debug('y: {0}'.format(y))
-            edges.append([str(x), str(y), c[i]])
-    return edges
-    
+def _default_pool()->EdgePool:
+    '''
+    The pool used when MUTLIPROCESSING is set without a pool: it is created on first use, and reused by the next calls.
+    '''
+    global _pool
+    if _pool is None:
+        _pool = EdgePool()
+        atexit.register(_pool.close)
+    return _pool
+
+
+def _reached_from(offsets:np.ndarray, targets:np.ndarray, start:int)->np.ndarray:
+    '''
+    A boolean array marking the nodes that can be reached from start, by a breadth-first search on CSR arrays.
+    '''
+    reached = np.zeros(len(offsets) - 1, dtype=bool)
+    reached[start] = True
+    frontier = np.array([start])
+    while len(frontier) > 0:
+        heads = targets[_out_edges(offsets, frontier)]
+        frontier = np.unique(heads[~reached[heads]])
+        reached[frontier] = True
+    return reached
+
 
-def check_feasibility(G:nx.DiGraph, source:str, target:str)->bool:
+def check_feasibility(G:Graph, source, target)->bool:
     '''
-    Given the graph, this function return if the integer programming is feasible or not.
+    Given the graph, this function return if the integer programming is feasible or not,
+    i.e., if there is a path from the source point to the target point.
 
-    >>> check_feasibility(setup(np.array([[1,1,0,0],[0,0,1,1],[1,0,1,0],[0,1,0,1]]), np.array([1,1,1,1]), np.array([0,0,0,0])), '[0 0 0 0]', '[1 1 1 1]')
+    >>> check_feasibility(setup(np.array([[1,1,0,0],[0,0,1,1],[1,0,1,0],[0,1,0,1]]), np.array([1,1,1,1]), np.array([0,0,0,0])), [0,0,0,0], [1,1,1,1])
     True
 
-    >>> check_feasibility(setup(np.array([[3, 1, 0, 0], [0, 0, 3, 1], [1, 0, 1, 0], [0, 1, 0, 1]]), np.array([2,2,1,1]), np.array([0,0,0,0])), '[0 0 0 0]', '[2 2 1 1]')
+    >>> check_feasibility(setup(np.array([[3, 1, 0, 0], [0, 0, 3, 1], [1, 0, 1, 0], [0, 1, 0, 1]]), np.array([2,2,1,1]), np.array([0,0,0,0])), [0,0,0,0], [2,2,1,1])
     False
     '''
-    try:
-        shortest_path = nx.shortest_path(G, source=source, target=target)
-        logging.info('shortest_path:{0}'.format(shortest_path))
-        return True
-    except Exception as error:
-        logging.info(error)
+    source, target = G.node(source), G.node(target)
+    if source < 0 or target < 0:
         return False
+    return bool(_reached_from(G.offsets, G.targets, source)[target])
 
 
-def is_the_graph_dag(G:nx.digraph)->bool:
+def _longest_paths_in_topological_order(G:Graph, source:int):
+    '''
+    Kahn's algorithm, layer by layer, with the longest-path DP from the source done on the fly:
+    when a layer of nodes with no unprocessed in-edges is removed, their longest-path values are final, and are pushed along their out-edges.
+
+    Returns three arrays: the weight of the longest path from the source to each node (-inf if not reached),
+    the last edge of that path (-1 if none), and whether each node was processed (False for the nodes on or after a cycle).
+    '''
+    best = np.full(G.num_nodes, -np.inf)
+    best[source] = 0
+    predecessors = np.full(G.num_nodes, -1, dtype=np.int64)
+    processed = np.zeros(G.num_nodes, dtype=bool)
+    in_degrees = np.bincount(G.targets, minlength=G.num_nodes)
+    layer = np.flatnonzero(in_degrees == 0)
+    while len(layer) > 0:
+        processed[layer] = True
+        edges = G.out_edges(layer)
+        _relax(G, np.repeat(layer, np.diff(G.offsets)[layer]), edges, best, predecessors)
+        heads, counts = np.unique(G.targets[edges], return_counts=True)
+        in_degrees[heads] -= counts
+        layer = heads[in_degrees[heads] == 0]
+    return best, predecessors, processed
+
+
+def _relax(G:Graph, tails:np.ndarray, edges:np.ndarray, best:np.ndarray, predecessors:np.ndarray)->bool:
+    '''
+    Push the longest-path values of the tails along the given edges. Returns True if some value strictly increased.
+    '''
+    heads = G.targets[edges]
+    candidates = best[tails] + G.weights[edges]
+    new_best = best.copy()
+    np.maximum.at(new_best, heads, candidates)
+    improving = (candidates > best[heads]) & (candidates == new_best[heads])
+    predecessors[heads[improving]] = edges[improving]
+    improved = bool(improving.any())
+    best[:] = new_best
+    return improved
+
+
+def _longest_paths_with_cycles(G:Graph, source:int, target:int):
+    '''
+    Bellman-Ford longest-path iterations, on the edges that lie on a walk from the source to the target.
+    Returns the longest-path values and the predecessor edges as in _longest_paths_in_topological_order,
+    or None if one of these walks contains a cycle of positive weight.
+    '''
+    tails = np.repeat(np.arange(G.num_nodes), np.diff(G.offsets))
+    order = np.argsort(G.targets, kind='stable')
+    reverse_offsets = np.concatenate(([0], np.cumsum(np.bincount(G.targets, minlength=G.num_nodes))))
+    relevant = _reached_from(G.offsets, G.targets, source) & _reached_from(reverse_offsets, tails[order], target)
+    edges = np.flatnonzero(relevant[tails] & relevant[G.targets])
+    best = np.full(G.num_nodes, -np.inf)
+    best[source] = 0
+    predecessors = np.full(G.num_nodes, -1, dtype=np.int64)
+    # Without a positive cycle, the longest walks are simple paths: they are found within |V| - 1 rounds, and the next round changes nothing.
+    for _ in range(int(relevant.sum()) + 1):
+        if not _relax(G, tails[edges], edges, best, predecessors):
+            return best, predecessors
+    return None
+
+
+def is_the_graph_dag(G:Graph)->bool:
     '''
     This method check if the graph contains any cycle.
     '''
-    try:
-        nx.find_cycle(G)
-        return False
-    except Exception as error:
-        logging.info('error'.format(error))
-        return True
+    return bool(_longest_paths_in_topological_order(G, 0)[2].all()) if G.num_nodes > 0 else True
 
 
-def tackle_optimization(G:nx.digraph, source, target)->str:
+def tackle_optimization(G:Graph, source:int, target:int):
     """
     This function tackle the optimization of the problem by search for the longest path from 0 to b.
     The path is the solution of the problem.
+
+    The longest paths are computed by a single DP pass in topological order, which also decides reachability.
+    Only if a cycle precedes the target, the walks through it are examined with Bellman-Ford.
+    Returns the path (as a list of edges) and its weight; None if the target cannot be reached;
+    or 'Unbounded' if a walk from the source to the target contains a cycle of positive weight.
+
+    >>> G = setup(np.array([[1,1],[1,-1]]), np.array([3,-1]), np.array([1,2]))
+    >>> path, weight = tackle_optimization(G, G.node([0,0]), G.node([3,-1]))
+    >>> [int(G.columns[edge]) for edge in path], weight
+    ([0, 1, 1], 5.0)
+    >>> G = setup(np.array([[1,-1,1]]), np.array([1]), np.array([1,0,0]))
+    >>> tackle_optimization(G, G.node([0]), G.node([1]))
+    'Unbounded'
+    >>> G = setup(np.array([[1,-1,1]]), np.array([1]), np.array([0,-3,2]))
+    >>> path, weight = tackle_optimization(G, G.node([0]), G.node([1]))
+    >>> [int(G.columns[edge]) for edge in path], weight
+    ([2], 2.0)
     """
-    if is_the_graph_dag(G):
-        return max([(path, sum(G.edges[pair]['weight'] for pair in list(nx.utils.pairwise(path)))) for path in nx.all_simple_paths(G, source, target)], key=lambda x: x[1])
-    else:
-        return 'Unbounded'
+    best, predecessors, processed = _longest_paths_in_topological_order(G, source)
+    if not processed[target]:
+        result = _longest_paths_with_cycles(G, source, target)
+        if result is None:
+            return 'Unbounded'
+        best, predecessors = result
+    if best[target] == -np.inf:
+        return None
+    path = []
+    node = target
+    while node != source:
+        path.append(int(predecessors[node]))
+        node = np.searchsorted(G.offsets, predecessors[node], side='right') - 1  # the tail of the edge.
+    return path[::-1], best[target]
 
 
 if __name__ == "__main__":
     import doctest
 
     (failures, tests) = doctest.testmod(report=True)
-    print("{} failures, {} tests".format(failures, tests))
\ No newline at end of file
+    print("{} failures, {} tests".format(failures, tests))